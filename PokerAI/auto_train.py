@@ -1,27 +1,52 @@
-import subprocess
-import pandas as pd
+import argparse
 import os
 import time
-from config import get_current_generation
+import pandas as pd
+from config import get_current_generation, set_generation
+from timing import PhaseTimer
+from train import load_opponents, make_env, train_generation
+
+# Generations run back to back in this process: imports, worker processes
+# and tables stay up, and the frozen opponent is swapped in place for the
+# generation that just finished.
 
 # === Settings ===
 MAX_GENERATIONS = 20
 MIN_WINRATE = 0.52
-WAIT_BETWEEN_GENERATIONS = 5  # seconds
 METRICS_FILE = "metrics.csv"
 
-def read_last_winrate():
+def read_last_result():
+    """The last generation's row of metrics.csv as a dict, or None."""
     if not os.path.exists(METRICS_FILE):
         return None
     try:
         df = pd.read_csv(METRICS_FILE)
-        if len(df) == 0 or "winrate_vs_prev" not in df.columns:
+        if len(df) == 0:
             return None
-        return df["winrate_vs_prev"].iloc[-1]
+        return df.iloc[-1].to_dict()
     except pd.errors.EmptyDataError:
         return None
 
-def main():
+def should_stop(result):
+    """
+    Why the last evaluation says to stop, or None. A point win rate from an
+    SPRT that stopped early is too noisy to hold against MIN_WINRATE; this
+    goes by the test's decision and the upper end of the interval instead.
+    In duplicate mode the interval is in chips per hand, so only the
+    decision counts.
+    """
+    if result is None:
+        return None
+    if result.get("decision") == "H0":
+        return "the new generation is not better (decision H0)"
+    duplicate = pd.notna(result.get("chips_per_hand"))
+    ci_high = result.get("ci_high")
+    if not duplicate and pd.notna(ci_high) and ci_high < MIN_WINRATE:
+        return f"winrate interval ends at {ci_high:.3f}, below {MIN_WINRATE}"
+    return None
+
+def main(num_workers=1, duplicate=False, use_league=False, pool_size=1, profile=False):
+    env = callbacks = None
     while True:
         current_gen = get_current_generation()
         print(f"\n🚀 Starting training for Generation {current_gen}")
@@ -31,22 +56,47 @@ def main():
             print("✅ Reached max generation limit.")
             break
 
-        # Early stopping if winrate fell below threshold
-        last_winrate = read_last_winrate()
-        if current_gen >= 3 and last_winrate is not None and last_winrate < MIN_WINRATE:
-            print(f"🛑 Stopping: last winrate ({last_winrate:.3f}) dropped below {MIN_WINRATE}")
+        # Early stopping once the last generation did not improve
+        reason = should_stop(read_last_result())
+        if current_gen >= 3 and reason is not None:
+            print(f"🛑 Stopping: {reason}")
             break
 
-        # Call the training script
+        start = time.perf_counter()
+        timer = PhaseTimer()
         try:
-            subprocess.run(["python", "train.py"], check=True)
-        except subprocess.CalledProcessError as e:
+            if env is None:
+                with timer.phase("setup"):
+                    env, callbacks = make_env(num_workers, load_opponents(current_gen, pool_size), profile)
+            train_generation(env, callbacks, current_gen, num_workers,
+                             duplicate, use_league, timer)
+        except Exception as e:
             print("🔥 Training failed. Exiting loop.")
             print(e)
             break
 
-        # Optional pause between generations
-        time.sleep(WAIT_BETWEEN_GENERATIONS)
+        # The next generation trains against this one (or a pool ending with
+        # it), loaded from its float16 export as a fresh run would load it
+        env.venv.set_policy(load_opponents(current_gen + 1, pool_size))
+        set_generation(current_gen + 1)
+
+        idle = time.perf_counter() - start - timer.total()
+        print(f"⏱ Generation {current_gen}: {timer.summary()}, idle {idle:.1f}s")
+
+    if env is not None:
+        env.close()
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=1,
+                        help="rollout worker processes (num_envs tables are split across them)")
+    parser.add_argument("--duplicate", action="store_true",
+                        help="evaluate on the stored deals with swapped seats")
+    parser.add_argument("--league", action="store_true",
+                        help="update the league ratings (league.py) after each generation")
+    parser.add_argument("--pool", type=int, default=1,
+                        help="train against this many past generations, drawn per hand")
+    parser.add_argument("--profile", action="store_true",
+                        help="log time per hot-path phase to TensorBoard")
+    args = parser.parse_args()
+    main(args.workers, args.duplicate, args.league, args.pool, args.profile)
@@ -0,0 +1,213 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+import numpy as np
+
+from card_buckets import turn_cache
+from cards import create_deck, deal_hole_cards, to_ints
+from environment import Environment, load_frozen_opponent
+from equity import exact_cache
+from evaluate import evaluate_hands
+from features import (get_full_state, get_full_state_batch, get_card_features, evaluate_preflop_hand_strength,
+                      get_winrate_pypokerengine, STREETS, HISTORY_LEN)
+from model_evaluation import evaluate_models
+
+# Throughput of the simulator hot paths. Every metric is a rate (higher is
+# better), measured with fixed seeds as the best of REPEATS runs.
+#
+#   python benchmark.py            print the current numbers
+#   python benchmark.py --save     store them as the baseline
+#   python benchmark.py --check    exit 1 if a metric fell more than
+#                                  --tolerance below the baseline
+
+BASELINE_PATH = "benchmark_baseline.json"
+TOLERANCE = 0.20
+REPEATS = 3
+SEED = 0
+EVAL_MODELS = ("poker_ppo_gen1", "poker_ppo_gen0")
+STREET_SIZES = {"preflop": 0, "flop": 3, "turn": 4, "river": 5}
+
+def seed_all(seed=SEED):
+    random.seed(seed)
+    np.random.seed(seed)
+
+def clear_caches():
+    """Empties the equity caches, so a repeat on the same seed is not served from the last one."""
+    exact_cache.clear()
+    turn_cache.clear()
+
+def best_rate(fn, count, repeats=REPEATS):
+    """Best count / seconds of fn() over repeats runs, each starting from cold caches."""
+    best = float("inf")
+    for _ in range(repeats):
+        clear_caches()
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return count / best
+
+def random_deals(count, board_size):
+    """count (hand, opponent_hand, board) deals with board_size community cards."""
+    deals = []
+    for _ in range(count):
+        hand, opponent_hand, deck = deal_hole_cards(create_deck())
+        deals.append((hand, opponent_hand, [deck.pop() for _ in range(board_size)]))
+    return deals
+
+def bench_environment():
+    env = Environment()
+    env.reset(seed=SEED)
+    n = 2000
+    result = {"env_reset_per_sec": best_rate(lambda: [env.reset() for _ in range(n)], n)}
+
+    best = None
+    for _ in range(REPEATS):
+        actions = np.random.default_rng(SEED).integers(0, 5, size=n)
+        hands = 0
+        clear_caches()
+        start = time.perf_counter()
+        env.reset(seed=SEED)
+        for action in actions:
+            _, _, done, _, _ = env.step(action)
+            if done:
+                hands += 1
+                env.reset()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best[0]:
+            best = (elapsed, hands)
+
+    elapsed, hands = best
+    result["env_steps_per_sec"] = n / elapsed
+    result["env_hands_per_sec"] = hands / elapsed
+    return result
+
+def bench_features():
+    seed_all()
+    states = []
+    for stage, size in STREET_SIZES.items():
+        for hand, _, board in random_deals(250, size):
+            states.append((hand, board, 0, 20, 90, 90, 2, stage, 0.5, 1, 2, 10, 1, 3, 4, 5, 12,
+                           [(0, 1), (1, 2), (0, 1)]))
+    result = {"get_full_state_per_sec": best_rate(lambda: [get_full_state(*s) for s in states], len(states))}
+    # Environment computes the card features once per street and reuses them
+    cards = [get_card_features(s[0], s[1]) for s in states]
+    out = np.zeros(37, dtype=np.float32)
+    result["get_full_state_cached_cards_per_sec"] = best_rate(
+        lambda: [get_full_state(*s, card_features=c, out=out) for s, c in zip(states, cards)], len(states))
+
+    # The same states as arrays
+    n = len(states)
+    hands = np.array([to_ints(s[0]) for s in states])
+    boards = np.zeros((n, 5), dtype=np.int64)
+    for i, s in enumerate(states):
+        boards[i, :len(s[1])] = to_ints(s[1])
+    street = np.array([STREETS[s[7]] for s in states])
+    history = np.full((n, HISTORY_LEN), -1)
+    history[:, :3] = [1, 2, 1]
+    columns = [np.array(c) for c in zip(*(s[2:17] for s in states))]
+    columns[5] = street
+    args = [hands, boards] + columns + [history]
+    result["get_full_state_batch_per_sec"] = best_rate(lambda: get_full_state_batch(*args), n)
+    return result
+
+def bench_preflop_strength():
+    seed_all()
+    hands = [hand for hand, _, _ in random_deals(10_000, 0)]
+    return {"preflop_strength_per_sec": best_rate(
+        lambda: [evaluate_preflop_hand_strength(h[0], h[1]) for h in hands], len(hands))}
+
+def bench_winrate_pypokerengine():
+    seed_all()
+    deals = random_deals(50, 3)
+    return {"winrate_pypokerengine_per_sec": best_rate(
+        lambda: [get_winrate_pypokerengine(hand, board) for hand, _, board in deals], len(deals))}
+
+def bench_evaluate_hands():
+    seed_all()
+    deals = random_deals(10_000, 5)
+    return {"evaluate_hands_per_sec": best_rate(
+        lambda: [evaluate_hands(*deal) for deal in deals], len(deals))}
+
+def bench_predict():
+    opponent = load_frozen_opponent()
+    if opponent is None:
+        return {}
+    obs = np.random.default_rng(SEED).random((2000, 37), dtype=np.float32)
+    return {"opponent_predict_per_sec": best_rate(
+        lambda: [opponent.predict(o, deterministic=False) for o in obs], len(obs))}
+
+def bench_evaluate_models():
+    if not all(os.path.exists(path + ".zip") for path in EVAL_MODELS):
+        return {}
+    # p0 == p1 keeps the likelihood ratio at zero, so all max_hands are played
+    start = time.perf_counter()
+    result = evaluate_models(*EVAL_MODELS, max_hands=1024, num_workers=1, seed=SEED, p0=0.5, p1=0.5)
+    return {"evaluate_models_hands_per_sec": result["hands"] / (time.perf_counter() - start)}
+
+BENCHMARKS = {
+    "environment": bench_environment,
+    "features": bench_features,
+    "preflop_strength": bench_preflop_strength,
+    "winrate_pypokerengine": bench_winrate_pypokerengine,
+    "evaluate_hands": bench_evaluate_hands,
+    "predict": bench_predict,
+    "evaluate_models": bench_evaluate_models,
+}
+
+def machine():
+    return {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()}
+
+def run(names):
+    metrics = {}
+    for name in names:
+        metrics.update(BENCHMARKS[name]())
+    return metrics
+
+def check(metrics, baseline, tolerance=TOLERANCE):
+    """Names of metrics more than tolerance below their baseline."""
+    return [name for name, value in metrics.items()
+            if name in baseline and value < baseline[name] * (1 - tolerance)]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the simulator hot paths")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument("--save", action="store_true", help=f"store the results in {BASELINE_PATH}")
+    parser.add_argument("--check", action="store_true", help="fail on a regression past the baseline")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    args = parser.parse_args()
+
+    metrics = run(args.only)
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            stored = json.load(f)
+        baseline = stored["metrics"]
+        if stored.get("machine") != machine():
+            print(f"[WARN] Baseline was recorded on {stored.get('machine')}")
+
+    for name, value in metrics.items():
+        line = f"{name:32s} {value:14.1f}"
+        if name in baseline:
+            line += f"  baseline {baseline[name]:14.1f}  {value / baseline[name] - 1:+7.1%}"
+        print(line)
+
+    if args.save:
+        baseline.update(metrics)
+        with open(args.baseline, "w") as f:
+            json.dump({"machine": machine(), "metrics": baseline}, f, indent=2, sort_keys=True)
+        print(f"Saved baseline: {args.baseline}")
+
+    if args.check:
+        regressions = check(metrics, baseline, args.tolerance)
+        if regressions:
+            print(f"Regressed by more than {args.tolerance:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+        print("No regressions.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import argparse
+import itertools
+import time
+from multiprocessing import Pool
+import numpy as np
+
+from build_flop_table import canonical_flops, runout_equities as flop_runout_equities
+from card_buckets import BUCKETS_PATH, NUM_BUCKETS, HISTOGRAM_BINS, histograms, nearest, cdf_distances
+from equity import enumerate_equity, runout_equities
+import flop_table
+from preflop_table import NUM_CLASSES, hand_class
+
+# One-time build of card_buckets.npz (needs flop_equity.npy). Preflop and
+# flop hands are clustered over every class, weighted by how often the class
+# is dealt; turn centroids and river equity ranges come from SAMPLES random
+# spots.
+
+SAMPLES = 20_000
+KMEANS_ITERATIONS = 100
+SEED = 0
+
+def kmeans(hists, k, weights=None, rng=None, iterations=KMEANS_ITERATIONS):
+    """
+    Weighted k-means of histograms on their CDFs (squared distance, the
+    usual stand-in for earth mover's distance). Centroids are returned as
+    histograms, ordered by mean equity.
+    """
+    rng = np.random.default_rng(SEED) if rng is None else rng
+    weights = np.ones(len(hists)) if weights is None else weights
+    cdf = np.cumsum(hists, axis=1)
+
+    # k-means++ seeding
+    centers = [cdf[rng.choice(len(cdf), p=weights / weights.sum())]]
+    for _ in range(k - 1):
+        d = cdf_distances(cdf, centers).min(axis=1) * weights
+        centers.append(cdf[rng.choice(len(cdf), p=d / d.sum())])
+    centers = np.array(centers)
+
+    for _ in range(iterations):
+        labels = cdf_distances(cdf, centers).argmin(axis=1)
+        total = np.bincount(labels, weights, minlength=k)
+        updated = np.stack([np.bincount(labels, weights * cdf[:, j], minlength=k) for j in range(cdf.shape[1])], axis=1)
+        updated = np.where(total[:, None] > 0, updated / np.maximum(total, 1e-12)[:, None], centers)
+        if np.allclose(updated, centers):
+            break
+        centers = updated
+
+    centroids = np.diff(centers, axis=1, prepend=0.0)
+    mids = (np.arange(HISTOGRAM_BINS) + 0.5) / HISTOGRAM_BINS
+    return centroids[np.argsort(centroids @ mids)]
+
+def flop_histograms(flop):
+    """(class keys, histograms, hands per class) of every hand on flop."""
+    pairs, board_equity = flop_runout_equities(flop)
+    keys = flop_table.class_keys(pairs, np.tile(flop, (len(pairs), 1)))
+    keys, first, counts = np.unique(keys, return_index=True, return_counts=True)
+    return keys, histograms(board_equity.T[first]), counts
+
+def build_flop(processes=None):
+    orbits = canonical_flops()
+    flops = list(orbits)
+    keys, hists, weights = [], [], []
+    start = time.time()
+    with Pool(processes) as pool:
+        for n, (k, h, c) in enumerate(pool.imap(flop_histograms, flops, chunksize=4)):
+            keys.append(k)
+            hists.append(h.astype(np.float32))
+            weights.append(c * orbits[flops[n]])
+            if n % 100 == 0:
+                print(f"[INFO] {n}/{len(flops)} flops, {time.time() - start:.0f}s")
+
+    keys, hists, weights = np.concatenate(keys), np.concatenate(hists), np.concatenate(weights).astype(np.float64)
+    order = np.argsort(keys)
+    keys, hists, weights = keys[order], hists[order], weights[order]
+    if not np.array_equal(keys, flop_table.load_table()[0]):
+        raise ValueError("flop classes differ from flop_equity.npy; rebuild it first")
+
+    centroids = kmeans(hists, NUM_BUCKETS, weights)
+    return nearest(hists, centroids).astype(np.uint8)
+
+def build_preflop():
+    """Clusters each starting hand class on its flop equity over every flop."""
+    hands = {}
+    for a, b in itertools.combinations(range(52), 2):
+        hands.setdefault(hand_class(((a >> 2) + 2, a & 3), ((b >> 2) + 2, b & 3)), (a, b))
+    hists, weights = np.empty((NUM_CLASSES, HISTOGRAM_BINS)), np.empty(NUM_CLASSES)
+    for cls in range(NUM_CLASSES):
+        hole = hands[cls]
+        rest = [c for c in range(52) if c not in hole]
+        flops = np.array(list(itertools.combinations(rest, 3)))
+        equity, _ = flop_table.flop_equity_batch(np.tile(hole, (len(flops), 1)), flops)
+        hists[cls] = histograms(equity)[0]
+        weights[cls] = 6 if hole[0] >> 2 == hole[1] >> 2 else (4 if hole[0] & 3 == hole[1] & 3 else 12)
+    centroids = kmeans(hists, NUM_BUCKETS, weights)
+    return nearest(hists, centroids).astype(np.uint8)
+
+def sample_spots(rng, board_size, count=SAMPLES):
+    for _ in range(count):
+        cards = rng.choice(52, 2 + board_size, replace=False).tolist()
+        yield cards[:2], cards[2:]
+
+def build_turn(rng):
+    hists = np.array([histograms(runout_equities(hole, board))[0] for hole, board in sample_spots(rng, 4)])
+    return kmeans(hists, NUM_BUCKETS, rng=rng)
+
+def build_river(rng):
+    """Upper equity edges of the river buckets: 1-D k-means of sampled equities."""
+    equity = np.array([enumerate_equity(hole, board) for hole, board in sample_spots(rng, 5)])
+    centers = np.quantile(equity, (np.arange(NUM_BUCKETS) + 0.5) / NUM_BUCKETS)
+    for _ in range(KMEANS_ITERATIONS):
+        labels = np.abs(equity[:, None] - centers[None, :]).argmin(axis=1)
+        centers = np.array([equity[labels == b].mean() if (labels == b).any() else centers[b]
+                            for b in range(NUM_BUCKETS)])
+        centers.sort()
+    return (centers[1:] + centers[:-1]) / 2
+
+def build_buckets(processes=None):
+    rng = np.random.default_rng(SEED)
+    start = time.time()
+    buckets = {"preflop": build_preflop()}
+    print(f"[INFO] preflop buckets, {time.time() - start:.0f}s")
+    buckets["turn"] = build_turn(rng)
+    print(f"[INFO] turn centroids, {time.time() - start:.0f}s")
+    buckets["river"] = build_river(rng)
+    print(f"[INFO] river edges, {time.time() - start:.0f}s")
+    buckets["flop"] = build_flop(processes)
+    print(f"[INFO] flop buckets, {time.time() - start:.0f}s")
+    return buckets
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the card abstraction")
+    parser.add_argument("--processes", type=int, default=None, help="worker processes (default: all cores)")
+    args = parser.parse_args()
+    np.savez(BUCKETS_PATH, **build_buckets(args.processes))
+    print(f"Saved card buckets: {BUCKETS_PATH}")
@@ -0,0 +1,131 @@
+import argparse
+import itertools
+import time
+from collections import Counter
+from multiprocessing import Pool
+import numpy as np
+
+from hand_eval import evaluate_keys, hand_keys
+from flop_table import TABLE_PATH, EQUITY_SCALE, class_keys
+
+# One-time build of flop_equity.npy. Only one flop per suit-isomorphism orbit
+# is solved; on it every hand, opponent hand and turn/river pair is scored
+# once, and each hand's wins over the opponents are counted with card removal
+# by sorting instead of comparing all pairs.
+
+SHOWDOWN_PAD = 8192  # > every score + 1, so sorted rows can be searched as one array
+
+def canonical_flops():
+    """Map one flop (sorted integer cards) per orbit of suit relabellings to the orbit size."""
+    flops, orbits = {}, Counter()
+    for flop in itertools.combinations(range(52), 3):
+        masks = [0, 0, 0, 0]
+        for c in flop:
+            masks[c & 3] |= 1 << (c >> 2)
+        key = tuple(sorted(masks, reverse=True))
+        flops.setdefault(key, flop)
+        orbits[key] += 1
+    return {flops[key]: orbits[key] for key in flops}
+
+def count_better(rows, queries):
+    """
+    How many entries of rows[r] are greater than and equal to each
+    queries[r, i], for every row at once (scores >= -1, higher loses).
+    """
+    n, m = rows.shape[0], rows.shape[1]
+    offset = np.arange(n, dtype=np.int64)[:, None] * SHOWDOWN_PAD
+    flat = (np.sort(rows, axis=1) + 1 + offset).ravel()
+    q = (queries + 1 + offset).reshape(-1)
+    left = np.searchsorted(flat, q, side="left")
+    right = np.searchsorted(flat, q, side="right")
+    end = np.repeat((np.arange(n, dtype=np.int64) + 1) * m, queries.shape[1])
+    return (end - right).reshape(queries.shape), (right - left).reshape(queries.shape)
+
+def runout_equities(flop):
+    """
+    Hands on flop (an (N, 2) array of the pairs of remaining cards) and an
+    (N runouts, N hands) matrix of each hand's equity after every turn and
+    river pair, NaN where the runout and the hand share a card.
+    """
+    flop = list(flop)
+    remaining = np.setdiff1d(np.arange(52), flop)
+    pair_a, pair_b = np.triu_indices(len(remaining), k=1)
+    pairs = np.stack([remaining[pair_a], remaining[pair_b]], axis=1)
+    n = len(pairs)
+
+    # scores[r, h]: hand h with turn and river r (both drawn from pairs),
+    # -1 where they share a card
+    flop_product, flop_bits = hand_keys([flop])
+    products, bits = hand_keys(pairs)
+    run_idx, hand_idx = np.nonzero((bits[:, None] & bits[None, :]) == 0)
+    scores = np.full((n, n), -1, dtype=np.int32)
+    scores[run_idx, hand_idx] = evaluate_keys(flop_product * products[run_idx] * products[hand_idx],
+                                              flop_bits | bits[run_idx] | bits[hand_idx])
+
+    # holding[c]: the pairs that contain remaining card c, the hand's own
+    # pair at holding[pair_a[h], slot[h, 0]] and holding[pair_b[h], slot[h, 1]]
+    holding = np.empty((len(remaining), len(remaining) - 1), dtype=np.int64)
+    slot = np.empty((n, 2), dtype=np.int64)
+    filled = np.zeros(len(remaining), dtype=np.int64)
+    for h, (a, b) in enumerate(zip(pair_a, pair_b)):
+        for side, card in enumerate((a, b)):
+            holding[card, filled[card]] = h
+            slot[h, side] = filled[card]
+            filled[card] += 1
+
+    # Opponents beaten or tied among all pairs, minus the pairs that hold
+    # either of the hand's cards (the hand itself is in both)
+    worse, same = count_better(scores, scores)
+    worse, same = worse.astype(np.int64), same.astype(np.int64)
+    by_card = scores[:, holding].reshape(n * len(remaining), -1)
+    card_worse, card_same = count_better(by_card, by_card)
+    card_worse = card_worse.reshape(n, len(remaining), -1)
+    card_same = card_same.reshape(n, len(remaining), -1)
+    for side, cards in enumerate((pair_a, pair_b)):
+        worse -= card_worse[:, cards, slot[:, side]]
+        same -= card_same[:, cards, slot[:, side]]
+    same += 1
+
+    opponents = (len(remaining) - 4) * (len(remaining) - 5) // 2
+    return pairs, np.where(scores >= 0, (worse + 0.5 * same) / opponents, np.nan)
+
+def solve_flop(flop):
+    """(class keys, equity, E[equity^2]) of every hand on flop."""
+    pairs, board_equity = runout_equities(flop)
+    equity = np.nanmean(board_equity, axis=0)
+    potential = np.nanmean(board_equity ** 2, axis=0)
+
+    keys = class_keys(pairs, np.tile(flop, (len(pairs), 1)))
+    keys, first = np.unique(keys, return_index=True)
+    return keys, equity[first], potential[first]
+
+def build_table(processes=None):
+    flops = list(canonical_flops())
+    print(f"[INFO] {len(flops)} canonical flops")
+    start = time.time()
+
+    keys, equity, potential = [], [], []
+    with Pool(processes) as pool:
+        for n, (k, e, p) in enumerate(pool.imap_unordered(solve_flop, flops, chunksize=4)):
+            keys.append(k)
+            equity.append(e)
+            potential.append(p)
+            if n % 100 == 0:
+                print(f"[INFO] {n}/{len(flops)} flops, {time.time() - start:.0f}s")
+
+    keys, equity, potential = np.concatenate(keys), np.concatenate(equity), np.concatenate(potential)
+    order = np.argsort(keys)
+    table = np.empty((2, len(keys)), dtype=np.uint32)
+    table[0] = keys[order]
+    table[1] = (np.round(equity[order] * EQUITY_SCALE).astype(np.uint32) << 16
+                | np.round(potential[order] * EQUITY_SCALE).astype(np.uint32))
+    print(f"[INFO] {len(keys)} classes")
+    return table
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the flop equity table")
+    parser.add_argument("--processes", type=int, default=None, help="worker processes (default: all cores)")
+    args = parser.parse_args()
+    table = build_table(args.processes)
+    np.save(TABLE_PATH, table)
+    print(f"Saved flop equity table: {TABLE_PATH}")
@@ -0,0 +1,76 @@
+import itertools
+import math
+import time
+from collections import Counter
+import numpy as np
+
+from cards import create_deck
+from hand_eval import evaluate
+from preflop_table import TABLE_PATH, NUM_CLASSES, EQUITY_SCALE, hand_class
+
+# One-time build of preflop_equity.npy. Every board is enumerated exactly,
+# but only one board per suit-isomorphism orbit is evaluated: class-level
+# results do not change when the suits of a board are permuted, so each
+# canonical board is weighted by the size of its orbit.
+
+def canonical_boards(deck):
+    """Map each canonical board (sorted per-suit rank masks) to its orbit size."""
+    orbits = Counter()
+    for board in itertools.combinations(range(len(deck)), 5):
+        masks = [0, 0, 0, 0]
+        for c in board:
+            masks[c % 4] |= 1 << (c // 4)
+        orbits[tuple(sorted(masks, reverse=True))] += 1
+    return orbits
+
+def board_from_masks(masks):
+    return [rank * 4 + suit
+            for suit, mask in enumerate(masks)
+            for rank in range(13) if mask >> rank & 1]
+
+def build_table():
+    deck = create_deck()  # deck[i] is the card with integer encoding i
+
+    hands = list(itertools.combinations(range(52), 2))
+    hand_classes = np.array([hand_class(deck[a], deck[b]) for a, b in hands])
+    one_hot = np.zeros((len(hands), NUM_CLASSES), dtype=np.float32)
+    one_hot[np.arange(len(hands)), hand_classes] = 1.0
+
+    hand_masks = np.array([(1 << a) | (1 << b) for a, b in hands], dtype=np.uint64)
+    disjoint = ((hand_masks[:, None] & hand_masks[None, :]) == 0).astype(np.float32)
+
+    # Every disjoint pair of hands sees the same number of runouts.
+    showdowns = (one_hot.T @ disjoint @ one_hot).astype(np.float64) * math.comb(48, 5)
+    wins = np.zeros((NUM_CLASSES, NUM_CLASSES), dtype=np.float64)
+
+    orbits = canonical_boards(deck)
+    print(f"[INFO] {len(orbits)} canonical boards")
+    start = time.time()
+
+    for n, (masks, weight) in enumerate(orbits.items()):
+        board = board_from_masks(masks)
+        board_mask = sum(1 << c for c in board)
+        valid = np.flatnonzero((hand_masks & np.uint64(board_mask)) == 0)
+
+        scores = np.array([evaluate(board + list(hands[i])) for i in valid], dtype=np.int32)
+
+        # lower score is the stronger hand
+        beats = (scores[:, None] < scores[None, :]).astype(np.float32)
+        beats += 0.5 * (scores[:, None] == scores[None, :])
+        beats *= disjoint[np.ix_(valid, valid)]
+
+        classes = one_hot[valid]
+        wins += weight * (classes.T @ beats @ classes)
+
+        if n % 5000 == 0:
+            print(f"[INFO] {n}/{len(orbits)} boards, {time.time() - start:.0f}s")
+
+    equity = np.empty((NUM_CLASSES, NUM_CLASSES + 1), dtype=np.float64)
+    equity[:, :NUM_CLASSES] = wins / showdowns
+    equity[:, NUM_CLASSES] = wins.sum(axis=1) / showdowns.sum(axis=1)
+    return equity
+
+if __name__ == "__main__":
+    equity = build_table()
+    np.save(TABLE_PATH, np.round(equity * EQUITY_SCALE).astype(np.uint16))
+    print(f"Saved preflop equity table: {TABLE_PATH}")
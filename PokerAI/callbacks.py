@@ -0,0 +1,95 @@
+import time
+from stable_baselines3.common.callbacks import BaseCallback
+
+from checkpoints import CheckpointWriter, KEEP_FULL, KEEP_SNAPSHOTS
+
+class WorkerTimingCallback(BaseCallback):
+    """
+    Logs rollout throughput of a SubprocPokerEnv: steps/sec of every worker
+    while it was stepping, its share of the rollout spent busy, and the
+    aggregate steps/sec of the rollout phase.
+    """
+
+    def __init__(self, verbose=0):
+        super().__init__(verbose)
+        self.last_stats = None
+        self.rollout_start = 0.0
+
+    def _on_rollout_start(self):
+        self.last_stats = self.training_env.worker_stats()
+        self.rollout_start = time.perf_counter()
+
+    def _on_step(self):
+        return True
+
+    def _on_rollout_end(self):
+        wall = time.perf_counter() - self.rollout_start
+        stats = self.training_env.worker_stats()
+        total_steps = 0
+        for i, (before, after) in enumerate(zip(self.last_stats, stats)):
+            steps = after["steps"] - before["steps"]
+            busy = after["busy"] - before["busy"]
+            total_steps += steps
+            self.logger.record(f"workers/steps_per_sec_{i}", steps / max(busy, 1e-9))
+            self.logger.record(f"workers/busy_fraction_{i}", busy / max(wall, 1e-9))
+        self.logger.record("workers/steps_per_sec_total", total_steps / max(wall, 1e-9))
+
+class ProfilerCallback(BaseCallback):
+    """
+    Enables a HotPathProfiler (timing.step_profiler) for the length of
+    training and after every rollout logs, per phase, its calls, total and
+    mean time, and a histogram of call durations for TensorBoard. Only
+    phases run in this process are seen: with SubprocPokerEnv that is the
+    batched opponent.
+    """
+
+    def __init__(self, profiler, verbose=0):
+        super().__init__(verbose)
+        self.profiler = profiler
+
+    def _on_training_start(self):
+        self.profiler.flush()
+        self.profiler.enable()
+
+    def _on_step(self):
+        return True
+
+    def _on_rollout_end(self):
+        for phase, durations in self.profiler.flush().items():
+            if len(durations) == 0:
+                continue
+            self.logger.record(f"profile/{phase}_calls", len(durations))
+            self.logger.record(f"profile/{phase}_total_s", float(durations.sum()))
+            self.logger.record(f"profile/{phase}_mean_ms", float(durations.mean() * 1000))
+            self.logger.record(f"profile/{phase}_ms", durations * 1000, exclude=("stdout", "log", "json", "csv"))
+
+    def _on_training_end(self):
+        self.profiler.disable()
+
+class AsyncCheckpointCallback(BaseCallback):
+    """
+    CheckpointCallback replacement: every save_freq calls the model is
+    handed to a checkpoints.CheckpointWriter, which writes the resumable zip
+    and the float16 policy in the background.
+    """
+
+    def __init__(self, save_freq, save_path, name_prefix="model",
+                 keep_full=KEEP_FULL, keep_snapshots=KEEP_SNAPSHOTS, verbose=0):
+        super().__init__(verbose)
+        self.save_freq = save_freq
+        self.save_path = save_path
+        self.name_prefix = name_prefix
+        self.keep_full = keep_full
+        self.keep_snapshots = keep_snapshots
+        self.writer = None
+
+    def _init_callback(self):
+        self.writer = CheckpointWriter(self.save_path, self.keep_full, self.keep_snapshots)
+
+    def _on_step(self):
+        if self.n_calls % self.save_freq == 0:
+            self.writer.save(self.model, f"{self.name_prefix}_{self.num_timesteps}_steps")
+        return True
+
+    def _on_training_end(self):
+        self.writer.close()
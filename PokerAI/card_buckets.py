@@ -0,0 +1,102 @@
+import os
+import numpy as np
+
+from equity import EquityCache, canonical_key, exact_cache, exact_equity, runout_equities
+import flop_table
+from preflop_table import hand_class, preflop_classes
+
+# Card abstraction built once by build_card_buckets.py. Hands are grouped per
+# street by the distribution of their final equity over the cards still to
+# come (NUM_BUCKETS clusters of HISTOGRAM_BINS-bin histograms, compared by
+# their cumulative form, i.e. earth mover's distance), so a made hand and a
+# draw of the same average equity land in different buckets. On the river
+# there is nothing left to come and the buckets are equity ranges. Bucket ids
+# are ordered by mean equity: 0 is the weakest.
+#
+# Preflop and flop buckets are tables indexed by hand class (the flop by the
+# classes of flop_table) and river buckets a search of the exact equity.
+# Turn hands are not a lookup: an uncached spot is enumerated in full
+# (runout_equities, about 4 ms) and assigned to the nearest centroid, then
+# cached per isomorphic spot. A turn table would need some 13M isomorphic
+# spots at that cost each, so none is built. The enumeration is the one the
+# turn equity needs anyway: both come out of it together (get_winrate,
+# turn_bucket), and EquityPrefetcher runs it off the stepping thread.
+
+BUCKETS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "card_buckets.npz")
+NUM_BUCKETS = 8
+HISTOGRAM_BINS = 10
+
+_buckets = None
+turn_cache = EquityCache()
+
+def available():
+    return _buckets is not None or os.path.exists(BUCKETS_PATH)
+
+def load_buckets():
+    global _buckets
+    if _buckets is None:
+        with np.load(BUCKETS_PATH) as data:
+            _buckets = {name: data[name] for name in data.files}
+    return _buckets
+
+def histograms(equities):
+    """Normalized HISTOGRAM_BINS-bin histograms of the rows of equities (NaN ignored)."""
+    equities = np.atleast_2d(equities)
+    bins = np.minimum((np.nan_to_num(equities, nan=-1.0) * HISTOGRAM_BINS).astype(np.int64), HISTOGRAM_BINS - 1)
+    rows = np.repeat(np.arange(len(equities)), equities.shape[1])
+    valid = ~np.isnan(equities).ravel()
+    counts = np.zeros((len(equities), HISTOGRAM_BINS))
+    np.add.at(counts, (rows[valid], bins.ravel()[valid]), 1)
+    return counts / counts.sum(axis=1, keepdims=True)
+
+def cdf_distances(cdf, centers):
+    """(N, K) squared distances between CDFs and center CDFs."""
+    return np.stack([((cdf - c) ** 2).sum(axis=1) for c in centers], axis=1)
+
+def nearest(hists, centroids):
+    """Index of the closest centroid to each histogram, by the distance of their CDFs."""
+    return cdf_distances(np.cumsum(hists, axis=1), np.cumsum(centroids, axis=1)).argmin(axis=1)
+
+def turn_bucket(hole, community, equities=None):
+    """
+    Bucket of a turn spot; equities (its runout_equities) may be passed in
+    if already known, else an uncached spot is enumerated (milliseconds).
+    """
+    key = canonical_key(hole, community)
+    bucket = turn_cache.get(key)
+    if bucket is None:
+        if equities is None:
+            equities = runout_equities(hole, community)
+        bucket = int(nearest(histograms(equities), load_buckets()["turn"])[0])
+        turn_cache.put(key, bucket)
+        # the same enumeration gives the turn equity
+        if exact_cache.get(key) is None:
+            exact_cache.put(key, float(equities.mean()))
+    return bucket
+
+def card_bucket(hole, community):
+    """Bucket (0 to NUM_BUCKETS - 1) of integer hole cards on 0, 3, 4 or 5 integer community cards."""
+    buckets = load_buckets()
+    if not community:
+        return int(buckets["preflop"][hand_class(*[((c >> 2) + 2, c & 3) for c in hole])])
+    if len(community) == 3:
+        return int(buckets["flop"][flop_table.class_index(flop_table.class_key(hole, community))])
+    if len(community) == 4:
+        return turn_bucket(hole, community)
+    return int(np.searchsorted(buckets["river"], exact_equity(hole, community), side="right"))
+
+def card_bucket_batch(hands, boards, board_sizes):
+    """
+    card_bucket over an (N, 2) array of integer hole cards and an (N, 5)
+    array of boards of which the first board_sizes[i] cards are dealt.
+    """
+    buckets = load_buckets()
+    result = np.empty(len(hands), dtype=np.int64)
+    preflop = board_sizes == 0
+    result[preflop] = buckets["preflop"][preflop_classes(hands[preflop])]
+    flop = board_sizes == 3
+    if flop.any():
+        result[flop] = buckets["flop"][flop_table.class_index(flop_table.class_keys(hands[flop], boards[flop, :3]))]
+    for i in np.flatnonzero(board_sizes > 3):
+        result[i] = card_bucket(hands[i].tolist(), boards[i, :board_sizes[i]].tolist())
+    return result
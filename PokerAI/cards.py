@@ -1,4 +1,5 @@
 import random
+import numpy as np
 
 suits = ['s', 'h', 'd', 'c']
 ranks = list(range(2, 15))  # 2 - 14 (J=11, Q=12, ..., A=14)
@@ -6,8 +7,33 @@ ranks = list(range(2, 15))  # 2 - 14 (J=11, Q=12, ..., A=14)
 def create_deck():
     return [(rank, suit) for rank in ranks for suit in suits]
 
-def deal_hole_cards(deck):
-    random.shuffle(deck)
+# Integer encoding used by the evaluators: card = (rank - 2) * 4 + suit index
+CARD_INTS = {card: i for i, card in enumerate(create_deck())}
+INT_CARDS = create_deck()
+
+def to_int(card):
+    return CARD_INTS[card]
+
+def to_ints(cards):
+    return [CARD_INTS[c] for c in cards]
+
+def from_int(card):
+    return (card // 4 + 2, suits[card % 4])
+
+def to_mask(cards):
+    mask = 0
+    for c in cards:
+        mask |= 1 << CARD_INTS[c]
+    return mask
+
+def deal_decks(rng, count):
+    """count shuffled decks as a (count, 52) array of integer cards, permuted in one call."""
+    return rng.permuted(np.tile(np.arange(52), (count, 1)), axis=1)
+
+def deal_hole_cards(deck, shuffled=False):
+    # shuffled=True deals from the deck as it is (e.g. a row of deal_decks)
+    if not shuffled:
+        random.shuffle(deck)
     ai_hand = [deck.pop(), deck.pop()]
     opponent_hand = [deck.pop(), deck.pop()]
     return ai_hand, opponent_hand, deck
@@ -0,0 +1,128 @@
+import copy
+import json
+import os
+import queue
+import threading
+from stable_baselines3.common.save_util import save_to_zip_file
+
+from numpy_policy import NumpyPolicy, policy_path
+from storage import atomic_write, file_hash
+
+# Checkpoints written by a background thread. The training thread only
+# copies the model's state (a few MB of tensors); pickling, compression and
+# disk I/O happen off the training loop. Every checkpoint has two files:
+#
+#   {name}.zip          everything PPO.load needs to resume training
+#   {name}_policy.npz   the actor alone in float16, for opponent pools and
+#                       evaluation (numpy_policy.load_policy picks it up)
+#
+# Each file's SHA-256 goes into manifest.json in the checkpoint folder, and
+# only the newest keep_full zips and keep_snapshots policies are kept.
+
+SNAPSHOT_DTYPE = "float16"
+KEEP_FULL = 2
+KEEP_SNAPSHOTS = 10
+MANIFEST = "manifest.json"
+
+def capture(model):
+    """
+    Copy of what BaseAlgorithm.save writes, taken on the training thread so
+    that training can go on changing the model while it is written.
+    """
+    exclude = set(model._excluded_save_params())
+    state_dicts_names, torch_variable_names = model._get_torch_save_params()
+    for name in state_dicts_names + torch_variable_names:
+        exclude.add(name.split(".")[0])
+    data = copy.deepcopy({k: v for k, v in model.__dict__.items() if k not in exclude})
+
+    pytorch_variables = None
+    if torch_variable_names:
+        pytorch_variables = {name: copy.deepcopy(getattr(model, name)) for name in torch_variable_names}
+    params = copy.deepcopy(model.get_parameters())
+
+    # from_ppo's arrays share memory with the live tensors
+    policy = NumpyPolicy.from_ppo(model)
+    policy.weights = [w.copy() for w in policy.weights]
+    policy.biases = [b.copy() for b in policy.biases]
+    return data, params, pytorch_variables, policy
+
+class CheckpointWriter:
+    """
+    save(model, name) captures the model and queues it; the files are written
+    to folder by a background thread. close() waits for the queue to drain.
+    """
+
+    def __init__(self, folder, keep_full=KEEP_FULL, keep_snapshots=KEEP_SNAPSHOTS):
+        self.folder = folder
+        self.keep_full = keep_full
+        self.keep_snapshots = keep_snapshots
+        os.makedirs(folder, exist_ok=True)
+        self.queue = queue.Queue(maxsize=2)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def save(self, model, name):
+        self.queue.put((os.path.join(self.folder, name), capture(model)))
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            path, (data, params, pytorch_variables, policy) = item
+            try:
+                self._write(path, data, params, pytorch_variables, policy)
+            except Exception as e:  # a failed checkpoint must not stop training
+                print(f"[WARN] Checkpoint {path} failed: {e}")
+
+    def _write(self, path, data, params, pytorch_variables, policy):
+        with atomic_write(path + ".zip", "wb") as f:
+            save_to_zip_file(f, data=data, params=params, pytorch_variables=pytorch_variables)
+        with atomic_write(policy_path(path), "wb") as f:
+            policy.save(f, SNAPSHOT_DTYPE)
+
+        manifest = self.manifest()
+        manifest[os.path.basename(path)] = {
+            "timesteps": int(data.get("num_timesteps", 0)),
+            "zip_sha256": file_hash(path + ".zip"),
+            "policy_sha256": file_hash(policy_path(path)),
+        }
+        self._prune(manifest)
+        with atomic_write(os.path.join(self.folder, MANIFEST)) as f:
+            json.dump(manifest, f, indent=2)
+
+    def manifest(self):
+        path = os.path.join(self.folder, MANIFEST)
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    def _prune(self, manifest):
+        names = sorted(manifest, key=lambda name: manifest[name]["timesteps"])
+        for name in names[:-self.keep_full] if self.keep_full else names:
+            base = os.path.join(self.folder, name)
+            if os.path.exists(base + ".zip"):
+                os.remove(base + ".zip")
+            manifest[name].pop("zip_sha256", None)
+        for name in names[:-self.keep_snapshots] if self.keep_snapshots else names:
+            base = os.path.join(self.folder, name)
+            if os.path.exists(policy_path(base)):
+                os.remove(policy_path(base))
+            del manifest[name]
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+def verify(folder):
+    """Names of the files in folder's manifest whose content no longer matches its hash."""
+    with open(os.path.join(folder, MANIFEST)) as f:
+        manifest = json.load(f)
+    bad = []
+    for name, entry in manifest.items():
+        base = os.path.join(folder, name)
+        for path, key in ((base + ".zip", "zip_sha256"), (policy_path(base), "policy_sha256")):
+            if key in entry and (not os.path.exists(path) or file_hash(path) != entry[key]):
+                bad.append(path)
+    return bad
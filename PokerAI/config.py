@@ -1,5 +1,7 @@
 import os
 
+from storage import atomic_write
+
 GEN_FILE = "current_gen.txt"
 
 def get_current_generation():
@@ -9,10 +11,13 @@ def get_current_generation():
     with open(GEN_FILE, "r") as f:
         return int(f.read().strip())
 
+def set_generation(gen):
+    with atomic_write(GEN_FILE) as f:
+        f.write(str(gen))
+
 def increment_generation():
     gen = get_current_generation() + 1
-    with open(GEN_FILE, "w") as f:
-        f.write(str(gen))
+    set_generation(gen)
     return gen
 
 # Global variable you can import
@@ -1,8 +1,6 @@
 import gymnasium as gym
 from gymnasium import spaces
 import numpy as np
-import random
-from stable_baselines3 import PPO
 import os
 from config import ppo_gen, increment_generation
 
@@ -10,13 +8,66 @@ gen_path = f"poker_ppo_gen{ppo_gen - 1}"
 fallback_path = "poker_ppo_model"
 
 # Game logic
-from cards import create_deck, deal_hole_cards, burn_card
-from features import get_full_state, get_winrate_pypokerengine, evaluate_preflop_hand_strength
+from cards import INT_CARDS, deal_decks, deal_hole_cards, burn_card, to_ints
+from features import get_full_state, get_card_features, get_winrate, evaluate_preflop_hand_strength
 from reward import calculate_reward
 from evaluate import evaluate_hands
+from numpy_policy import NumpyPolicy, load_policy, policy_path
+from opponent_pool import OpponentPool
+from hand_history import new_records
+from equity_prefetch import EquityPrefetcher
+
+DECK_BATCH = 256  # decks shuffled per call to deal_decks
+STREETS = {"preflop": 0, "flop": 1, "turn": 2, "river": 3}
+
+def model_exists(path):
+    return os.path.exists(path + ".zip") or os.path.isdir(path) or os.path.exists(policy_path(path))
+
+def load_frozen_opponent(path=None):
+    path = gen_path if path is None else path
+    if model_exists(path):
+        model = load_policy(path)
+        print(f"[INFO] Loaded frozen opponent from {path}")
+        return model
+    elif model_exists(fallback_path):
+        model = load_policy(fallback_path)
+        print(f"[INFO] Loaded frozen opponent from {fallback_path}")
+        return model
+    print("[INFO] No frozen opponent model found — using random actions.")
+    return None
+
+class GameState:
+    """
+    A hand in progress, as Environment.snapshot() captures it: the cards
+    (the remaining deck in dealing order included), chips, counters, action
+    history and the last observation. Filled in place, so one GameState can
+    be reused for every snapshot of a rollout loop. The random generator is
+    not part of it; rollouts from one state differ in their sampled opponent
+    actions and equities unless env.np_random is reset as well.
+    """
+
+    SCALARS = (
+        "position", "round_stage", "done", "current_player", "last_winrate",
+        "reward_given", "last_action_ai1", "last_action_ai2", "total_bet_ai1",
+        "total_bet_ai2", "raises_this_street", "fold_count", "call_count",
+        "raise_count", "pot", "stack_ai1", "stack_ai2", "current_bet",
+    )
+    __slots__ = SCALARS + ("deck", "ai1_hand", "ai2_hand", "board", "action_history",
+                           "hand_log", "card_features", "obs", "opponent")
 
-class Environment(gym.Env):
     def __init__(self):
+        self.deck = []
+        self.ai1_hand = []
+        self.ai2_hand = []
+        self.board = []
+        self.action_history = []
+        self.hand_log = []
+        self.card_features = {}
+        self.obs = np.zeros(37, dtype=np.float32)
+        self.opponent = None
+
+class Environment(gym.Env):
+    def __init__(self, hand_history=None, prefetch_equity=False):
         super().__init__()
 
         self.observation_space = spaces.Box(
@@ -28,16 +79,15 @@ class Environment(gym.Env):
         # 0: fold, 1: call, 2: raise (min), 3: raise (pot), 4: all-in
         self.action_space = spaces.Discrete(5)
 
-        if os.path.exists(gen_path + ".zip") or os.path.isdir(gen_path):
-            self.frozen_opponent = PPO.load(gen_path)
-            print(f"[INFO] Loaded frozen opponent from {gen_path}")
-        elif os.path.exists(fallback_path + ".zip") or os.path.isdir(fallback_path):
-            self.frozen_opponent = PPO.load(fallback_path)
-            print(f"[INFO] Loaded frozen opponent from {fallback_path}")
-        else:
-            self.frozen_opponent = None
-            print("[INFO] No frozen opponent model found — using random actions.")
-
+        self.frozen_opponent = load_frozen_opponent()
+        self.hand_history = hand_history  # optional hand_history.HandHistoryWriter
+        # Turn and river equities enumerated in the background from reset on
+        self.prefetch = EquityPrefetcher() if prefetch_equity else None
+        # Dealing, equity sampling and the opponent's random choices all draw
+        # from self.np_random, seeded by reset(seed)
+        self._decks = None
+        self._next_deck = 0
+        self._obs = np.zeros(self.observation_space.shape, dtype=np.float32)
         self.reset_vars()
 
     def reset_vars(self):
@@ -60,16 +110,30 @@ class Environment(gym.Env):
         self.call_count = 0
         self.raise_count = 0
         self.action_history = [] 
+        self.hand_log = []  # (actor, street, action, bet, winrate) for the hand history
+        # Card-derived features per (player, board size); the board only
+        # grows within a hand, so its size identifies the street
+        self._card_features = {}
 
     def reset(self, seed=None, options=None):
         super().reset(seed=seed)
-        if seed is not None:
-            np.random.seed(seed)
 
         self.reset_vars()
+        if isinstance(self.frozen_opponent, OpponentPool):
+            self.frozen_opponent.next_hand(self.np_random)  # a new opponent from the pool for every hand
 
-        self.deck = create_deck()
-        self.ai1_hand, self.ai2_hand, self.deck = deal_hole_cards(self.deck)
+        # Decks are shuffled DECK_BATCH at a time
+        if seed is not None or self._decks is None or self._next_deck == len(self._decks):
+            self._decks = deal_decks(self.np_random, DECK_BATCH)
+            self._next_deck = 0
+        deck = [INT_CARDS[c] for c in self._decks[self._next_deck].tolist()]
+        self._next_deck += 1
+        self.ai1_hand, self.ai2_hand, self.deck = deal_hole_cards(deck, shuffled=True)
+        if self.prefetch is not None:
+            # The board is dealt from the end of the deck, after a burn card per
+            # street. Each street has one actor: AI1 on the turn, AI2 on the river
+            board = to_ints([self.deck[-2], self.deck[-3], self.deck[-4], self.deck[-6], self.deck[-8]])
+            self.prefetch.submit([(0, to_ints(self.ai1_hand), board[:4]), (1, to_ints(self.ai2_hand), board)])
         self.board = []
         self.round_stage = 'preflop'
         self.current_player = 0
@@ -82,26 +146,70 @@ class Environment(gym.Env):
         obs = self._get_obs()
         return obs, {}
 
+    def snapshot(self, state=None):
+        """The current hand as a GameState, written into state if one is given."""
+        state = GameState() if state is None else state
+        for name in GameState.SCALARS:
+            setattr(state, name, getattr(self, name))
+        state.deck[:] = self.deck
+        state.ai1_hand[:] = self.ai1_hand
+        state.ai2_hand[:] = self.ai2_hand
+        state.board[:] = self.board
+        state.action_history[:] = self.action_history
+        state.hand_log[:] = self.hand_log
+        state.card_features.clear()
+        state.card_features.update(self._card_features)
+        np.copyto(state.obs, self._obs)
+        if isinstance(self.frozen_opponent, OpponentPool):
+            state.opponent = self.frozen_opponent.current
+        return state
+
+    def restore(self, state):
+        """Continues from a snapshot; state is left as it was and may be restored again."""
+        for name in GameState.SCALARS:
+            setattr(self, name, getattr(state, name))
+        self.deck[:] = state.deck
+        self.board[:] = state.board
+        self.action_history[:] = state.action_history
+        self.hand_log[:] = state.hand_log
+        self._card_features.clear()
+        self._card_features.update(state.card_features)
+        np.copyto(self._obs, state.obs)
+        # New lists: the info of earlier steps holds on to the hands
+        self.ai1_hand = list(state.ai1_hand)
+        self.ai2_hand = list(state.ai2_hand)
+        if state.opponent is not None and isinstance(self.frozen_opponent, OpponentPool):
+            self.frozen_opponent.current = state.opponent
+        return self._obs.copy()
+
     def _get_obs(self):
         hand = self.ai1_hand if self.current_player == 0 else self.ai2_hand
-        board = self.board.copy()
         position = int(self.current_player == 1)  # Acts last = 1
         opponent_last_action = self.last_action_ai2 if self.current_player == 0 else self.last_action_ai1
         opponent_total_bet = self.total_bet_ai2 if self.current_player == 0 else self.total_bet_ai1
         total_hands = max(1, self.fold_count + self.call_count + self.raise_count)
 
-        state = get_full_state(
-            hand, board, position, self.pot,
+        key = (self.current_player, len(self.board))
+        card_features = self._card_features.get(key)
+        if card_features is None:
+            if self.prefetch is not None:
+                self.prefetch.collect(*key)
+            card_features = get_card_features(hand, self.board)
+            self._card_features[key] = card_features
+
+        get_full_state(
+            hand, self.board, position, self.pot,
             self.stack_ai1, self.stack_ai2,
             self.current_bet, self.round_stage,
             self.last_winrate,
             self.last_action_ai1, self.last_action_ai2,
             opponent_total_bet, self.raises_this_street,
             self.fold_count, self.call_count, self.raise_count,
-            total_hands, self.action_history 
+            total_hands, self.action_history,
+            card_features=card_features, out=self._obs
         )
 
-        obs = np.array(state, dtype=np.float32)
+        obs = self._obs.copy()
         # print(f"[DEBUG] obs shape: {obs.shape}, values: {obs}")
         # print(f"[DEBUG] expected shape: {self.observation_space.shape}")
         # assert self.observation_space.contains(obs), "Observation out of bounds!"
@@ -140,11 +248,15 @@ class Environment(gym.Env):
 
         # Opponent (AI2)
         if self.current_player == 1:
-            obs = self._get_obs()
-            if self.frozen_opponent:
+            # The buffer still holds AI2's observation from the end of the
+            # previous step, nothing has changed since
+            obs = self._obs
+            if isinstance(self.frozen_opponent, (NumpyPolicy, OpponentPool)):
+                action, _ = self.frozen_opponent.predict(obs, deterministic=False, rng=self.np_random)
+            elif self.frozen_opponent:
                 action, _ = self.frozen_opponent.predict(obs, deterministic=False)
             else:
-                action = self.action_space.sample()
+                action = int(self.np_random.integers(0, 5))
 
             if action == 0:
                 self.fold_count += 1
@@ -176,16 +288,23 @@ class Environment(gym.Env):
         # Winrate evaluation
         hand = self.ai1_hand if self.current_player == 0 else self.ai2_hand
         if self.round_stage != "preflop":
-            current_winrate = get_winrate_pypokerengine(hand, self.board)
+            if self.prefetch is not None:
+                self.prefetch.collect(self.current_player, len(self.board))
+            current_winrate = get_winrate(hand, self.board, rng=self.np_random)
         else:
             current_winrate = evaluate_preflop_hand_strength(hand[0], hand[1])
         self.last_winrate = current_winrate
+        if self.hand_history is not None:
+            self.hand_log.append((self.current_player, STREETS[self.round_stage], action,
+                                  raise_amount, current_winrate))
 
         # Reward logic
         reward = calculate_reward(self, self.current_player, action, current_winrate)
 
         if action == 0:
             self.done = True
+            if self.hand_history is not None:
+                self.record_hand(2 * self.current_player - 1, round(reward, 3))
             return self._get_obs(), round(reward, 3), True, False, info
 
         self.action_history.append((self.current_player, action))
@@ -201,14 +320,38 @@ class Environment(gym.Env):
             self.advance_to_river()
         elif self.round_stage == "river":
             score1 = evaluate_hands(self.ai1_hand, self.ai2_hand, self.board)
-            score2 = evaluate_hands(self.ai2_hand, self.ai1_hand, self.board)
+            score2 = -score1  # evaluate_hands is antisymmetric
             reward = 1 if score1 < score2 else -1 if score1 > score2 else 0
             self.done = True
+            if self.hand_history is not None:
+                self.record_hand(score1, reward)
             return self._get_obs(), reward, True, False, info
 
         self.current_player = 1 - self.current_player
         return self._get_obs(), reward, False, False, info
 
+    def record_hand(self, winner, reward):
+        """
+        Hands the finished hand to self.hand_history. winner is 1 if AI1 takes
+        the pot, -1 if AI2 does and 0 on a split; the winner's net chips are
+        what the loser put in.
+        """
+        record = new_records(1)[0]
+        record["ai1_hand"] = to_ints(self.ai1_hand)
+        record["ai2_hand"] = to_ints(self.ai2_hand)
+        record["board"][:len(self.board)] = to_ints(self.board)
+        record["num_actions"] = len(self.hand_log)
+        for i, (actor, street, action, bet, winrate) in enumerate(self.hand_log):
+            record["actor"][i] = actor
+            record["street"][i] = street
+            record["action"][i] = action
+            record["bet"][i] = bet
+            record["equity"][i] = winrate
+        record["pot"] = self.pot
+        record["chips"] = winner * (self.total_bet_ai2 if winner > 0 else self.total_bet_ai1)
+        record["reward"] = reward
+        self.hand_history.write(record)
+
     def advance_to_flop(self):
         burn_card(self.deck)
         self.board.extend([self.deck.pop(), self.deck.pop(), self.deck.pop()])
@@ -0,0 +1,166 @@
+import itertools
+import math
+from collections import OrderedDict
+import numpy as np
+from cards import to_ints
+import flop_table
+from hand_eval import evaluate_batch, evaluate_keys, hand_keys
+
+# Equity against one random opponent hand. Small spots (turn and river) are
+# enumerated exactly and cached by their suit-isomorphic canonical form;
+# larger ones use batched Monte Carlo, where every simulation draws the
+# opponent's hole cards and the rest of the board at once and both 7-card
+# hands are scored with vectorized table lookups.
+
+DEFAULT_SIMULATIONS = 2000
+EXACT_THRESHOLD = 50_000   # turn: 46 * 990 = 45,540 showdowns; flop: ~1.07M
+CACHE_SIZE = 100_000
+ALL_CARDS = np.arange(52)
+
+_rng = np.random.default_rng()
+
+def estimate_equity(hand, board, nb_simulation=DEFAULT_SIMULATIONS, rng=None):
+    """
+    Monte Carlo equity of hand (ties count half) and its standard error.
+    :param hand: [(14, 'h'), (13, 'h')]
+    :param board: 0-5 community cards
+    """
+    rng = _rng if rng is None else rng
+    hole = to_ints(hand)
+    community = to_ints(board)
+    remaining = np.setdiff1d(ALL_CARDS, hole + community)
+    missing = 5 - len(community)
+
+    # Random keys sorted per row give distinct cards for every simulation
+    draws = rng.random((nb_simulation, len(remaining))).argsort(axis=1)[:, :2 + missing]
+    sample = remaining[draws]
+
+    full_board = np.empty((nb_simulation, 5), dtype=np.int64)
+    full_board[:, :len(community)] = community
+    full_board[:, len(community):] = sample[:, 2:]
+
+    ai_scores = evaluate_batch(np.concatenate([np.broadcast_to(hole, (nb_simulation, 2)), full_board], axis=1))
+    opp_scores = evaluate_batch(np.concatenate([sample[:, :2], full_board], axis=1))
+
+    results = (ai_scores < opp_scores) + 0.5 * (ai_scores == opp_scores)
+    equity = float(results.mean())
+    std_err = float(results.std(ddof=1) / math.sqrt(nb_simulation)) if nb_simulation > 1 else 0.0
+    return equity, std_err
+
+class EquityCache:
+    """Bounded LRU cache with hit, miss and eviction counters."""
+
+    def __init__(self, maxsize=CACHE_SIZE):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        return {
+            "size": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = self.misses = self.evictions = 0
+
+exact_cache = EquityCache()
+
+def canonical_key(hole, community):
+    """
+    Equity does not change when suits are relabelled, so a spot is keyed by
+    the sorted per-suit (hole ranks, board ranks) masks.
+    """
+    masks = [[0, 0] for _ in range(4)]
+    for c in hole:
+        masks[c & 3][0] |= 1 << (c >> 2)
+    for c in community:
+        masks[c & 3][1] |= 1 << (c >> 2)
+    return tuple(sorted((tuple(m) for m in masks), reverse=True))
+
+def count_showdowns(nb_board_cards):
+    remaining = 52 - 2 - nb_board_cards
+    missing = 5 - nb_board_cards
+    return math.comb(remaining, missing) * math.comb(remaining - missing, 2)
+
+def runout_equities(hole, community):
+    """
+    Exact equity of integer hole cards after each way the board can be
+    completed, one entry per runout (itertools.combinations order); every
+    runout leaves the same number of opponent hands.
+    """
+    remaining = np.setdiff1d(ALL_CARDS, hole + community)
+    missing = 5 - len(community)
+
+    pair_a, pair_b = np.triu_indices(len(remaining), k=1)
+    opp = np.stack([remaining[pair_a], remaining[pair_b]], axis=1)
+    combos = list(itertools.combinations(remaining, missing))
+    runouts = np.array(combos, dtype=np.int64).reshape(len(combos), missing)
+
+    # Keys of disjoint card sets combine, so each hand is assembled from the
+    # keys of its parts rather than evaluated from scratch
+    board_product, board_bits = hand_keys([community])
+    hole_product, hole_bits = hand_keys([hole])
+    opp_products, opp_bits = hand_keys(opp)
+    run_products, run_bits = hand_keys(runouts)
+
+    # Every (opponent hand, runout) pair that shares no card
+    opp_idx, run_idx = np.nonzero((opp_bits[:, None] & run_bits[None, :]) == 0)
+
+    ai_scores = evaluate_keys(board_product * hole_product * run_products,
+                              board_bits | hole_bits | run_bits)[run_idx]
+    opp_scores = evaluate_keys(board_product * opp_products[opp_idx] * run_products[run_idx],
+                               board_bits | opp_bits[opp_idx] | run_bits[run_idx])
+
+    results = (ai_scores < opp_scores) + 0.5 * (ai_scores == opp_scores)
+    return np.bincount(run_idx, results, len(runouts)) / np.bincount(run_idx, minlength=len(runouts))
+
+def enumerate_equity(hole, community):
+    """Exact equity of integer hole cards over every opponent hand and runout."""
+    return float(runout_equities(hole, community).mean())
+
+def compute_equity(hand, board, nb_simulation=DEFAULT_SIMULATIONS, rng=None,
+                   exact_threshold=EXACT_THRESHOLD):
+    """
+    Equity of hand and its standard error. Flops are read from the exact
+    flop table when it has been built; other spots with at most
+    exact_threshold showdowns are enumerated exactly (error 0.0) through
+    exact_cache, larger ones fall back to estimate_equity.
+    """
+    if len(board) == 3 and flop_table.available():
+        equity, _ = flop_table.lookup(flop_table.class_key(to_ints(hand), to_ints(board)))
+        return float(equity), 0.0
+    if count_showdowns(len(board)) > exact_threshold:
+        return estimate_equity(hand, board, nb_simulation, rng)
+
+    return exact_equity(to_ints(hand), to_ints(board)), 0.0
+
+def exact_equity(hole, community):
+    """enumerate_equity of integer cards through exact_cache."""
+    key = canonical_key(hole, community)
+    equity = exact_cache.get(key)
+    if equity is None:
+        equity = enumerate_equity(hole, community)
+        exact_cache.put(key, equity)
+    return equity
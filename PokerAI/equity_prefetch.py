@@ -0,0 +1,74 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import card_buckets
+from equity import canonical_key, exact_cache, runout_equities
+
+# Turn and river equities of the player acting there, enumerated on a
+# thread pool as soon as the deck is shuffled. The enumeration is NumPy
+# work that releases the GIL, so it runs on idle cores while step does the
+# opponent's inference and the features. Finished results are put into the equity and card
+# abstraction caches, which the usual code paths then hit, so the values
+# are exactly those of a synchronous call.
+
+_executor = None
+
+def shared_executor(workers=None):
+    global _executor
+    if _executor is None:
+        # One core is left to the thread that runs step
+        workers = workers or max(1, (os.cpu_count() or 1) - 1)
+        _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="equity")
+    return _executor
+
+class EquityPrefetcher:
+    """
+    submit() queues the spots of a new hand; collect() is called just before
+    a spot is needed. A finished spot counts as ready. A running one is
+    waited for. One still queued is cancelled and left to the synchronous
+    path (fallback).
+    """
+
+    def __init__(self, workers=None):
+        self.executor = shared_executor(workers)
+        self.pending = {}
+        self.ready = 0
+        self.waited = 0
+        self.fallback = 0
+
+    def submit(self, spots):
+        """spots: (player, integer hole cards, integer board) of each spot to prefetch."""
+        self.cancel()
+        for player, hole, community in spots:
+            if canonical_key(hole, community) in exact_cache.entries:
+                continue
+            future = self.executor.submit(runout_equities, hole, community)
+            self.pending[player, len(community)] = (hole, community, future)
+
+    def collect(self, player, board_size):
+        entry = self.pending.pop((player, board_size), None)
+        if entry is None:
+            return
+        hole, community, future = entry
+        if future.done():
+            self.ready += 1
+        elif future.cancel():
+            self.fallback += 1
+            return
+        else:
+            self.waited += 1
+        equities = future.result()
+
+        if len(community) == 4 and card_buckets.available():
+            card_buckets.turn_bucket(hole, community, equities)
+        key = canonical_key(hole, community)
+        if key not in exact_cache.entries:
+            exact_cache.put(key, float(equities.mean()))
+
+    def cancel(self):
+        for _, _, future in self.pending.values():
+            future.cancel()
+        self.pending.clear()
+
+    def stats(self):
+        return {"ready": self.ready, "waited": self.waited, "fallback": self.fallback}
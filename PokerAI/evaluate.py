@@ -1,15 +1,10 @@
-from treys import Evaluator, Card
-from cards import convert_to_treys
+from cards import to_ints
+from hand_eval import evaluate
 
 def evaluate_hands(ai_hand, opponent_hand, board):
-    evaluator = Evaluator()
-
-    ai_cards = [Card.new(convert_to_treys(c)) for c in ai_hand]
-    opp_cards = [Card.new(convert_to_treys(c)) for c in opponent_hand]
-    board_cards = [Card.new(convert_to_treys(c)) for c in board]
-
-    ai_score = evaluator.evaluate(board_cards, ai_cards)
-    opp_score = evaluator.evaluate(board_cards, opp_cards)
+    board_cards = to_ints(board)
+    ai_score = evaluate(to_ints(ai_hand) + board_cards)
+    opp_score = evaluate(to_ints(opponent_hand) + board_cards)
 
     if ai_score < opp_score:
         return 1
@@ -1,9 +1,32 @@
-from treys import Evaluator, Card
-from cards import convert_to_treys
-import random
-from pypokerengine.utils.card_utils import gen_cards
-from pypokerengine.engine.hand_evaluator import HandEvaluator
+import numpy as np
+from cards import to_ints
+from hand_eval import evaluate, evaluate_batch, MAX_RANK
 from pypokerengine.utils.card_utils import gen_cards, estimate_hole_card_win_rate
+from preflop_table import preflop_equity, preflop_equity_batch
+from equity import compute_equity, DEFAULT_SIMULATIONS
+import card_buckets
+
+# Observations are versioned by what they hold; a policy is fed the version
+# it was trained on (numpy_policy records it with the exported weights).
+#   1: column BUCKET is the hand strength bucket (get_hand_strength_bucket)
+#   2: column BUCKET is the card abstraction's bucket (card_buckets)
+FEATURE_VERSION = 2
+SCORE, BUCKET, STREET = 11, 21, 22  # observation columns
+STRENGTH_BOUNDS = [0.2, 0.4, 0.6, 0.8]  # of get_hand_strength_bucket
+
+STREETS = {"preflop": 0, "flop": 1, "turn": 2, "river": 3}
+BOARD_SIZE = np.array([0, 3, 4, 5])  # visible board cards per street
+HISTORY_LEN = 10
+OBS_SIZE = 37
+WINDOW_COUNT = np.array([bin(m).count("1") for m in range(32)])
+
+def get_winrate(ai_hand, board, nb_simulation=DEFAULT_SIMULATIONS, rng=None):
+    if len(board) == 4:
+        # The turn bucket's enumeration also gives the exact turn equity
+        # (exact_cache), so the two cost one enumeration between them
+        card_buckets.turn_bucket(to_ints(ai_hand), to_ints(board))
+    equity, _ = compute_equity(ai_hand, board, nb_simulation, rng)
+    return round(equity, 3)
 
 def get_winrate_pypokerengine(ai_hand, board, nb_simulation=25):
     hole = [to_ppe(c) for c in ai_hand]
@@ -28,28 +51,11 @@ def to_ppe(card):
     suit = suit_map[card[1]]
     return suit + rank  # e.g., 'HA'
 
-def evaluate_preflop_hand_strength(card1, card2, nb_simulation=200):
-    hole = [to_ppe(card1), to_ppe(card2)]
-    win = 0
-
-    for _ in range(nb_simulation):
-        deck = [s + r for r in "23456789TJQKA" for s in "SHDC"]
-        used = set(hole)
-        deck = [c for c in deck if c not in used]
-        opp_hand = random.sample(deck, 2)
-        used.update(opp_hand)
-        deck = [c for c in deck if c not in used]
-        community = random.sample(deck, 5)
-
-        ai_score = HandEvaluator.eval_hand(gen_cards(hole), gen_cards(community))
-        opp_score = HandEvaluator.eval_hand(gen_cards(opp_hand), gen_cards(community))
-
-        if ai_score < opp_score:
-            win += 1
-        elif ai_score == opp_score:
-            win += 0.5
-
-    return round(win / nb_simulation, 3)
+def evaluate_preflop_hand_strength(card1, card2):
+    # Same quantity the old 200-trial Monte Carlo converged to: it compared
+    # pypokerengine scores (higher is better) as if lower were better, so it
+    # measured the opponent's share of the pot.
+    return round(1.0 - preflop_equity(card1, card2), 3)
 
 def get_hand_category(card1, card2):
     if card1[0] == card2[0]: return 0
@@ -80,11 +86,8 @@ def get_hand_strength(hand, board):
         # Preflop: use estimated strength
         return 1.0 - evaluate_preflop_hand_strength(hand[0], hand[1])  # Normalize: lower is better
 
-    evaluator = Evaluator()
-    h = [Card.new(convert_to_treys(c)) for c in hand]
-    b = [Card.new(convert_to_treys(c)) for c in board]
-    score = evaluator.evaluate(b, h)
-    return score / 7462  # normalized
+    score = evaluate(to_ints(hand) + to_ints(board))
+    return score / MAX_RANK  # normalized
 
 def get_hand_strength_bucket(score):
     if score < 0.2: return 4
@@ -93,50 +96,113 @@ def get_hand_strength_bucket(score):
     elif score < 0.8: return 1
     else: return 0
 
+def round_array(values, ndigits):
+    # Python's round() element-wise; np.round can land on the other side
+    # of a tie (0.005 * 1 -> 0.0 instead of 0.01)
+    return np.array([round(v, ndigits) for v in np.asarray(values).tolist()])
+
 def get_aggression_factor(raise_count, call_count):
     return round(raise_count / (call_count + 1), 2)
 
 def get_betting_pattern_index(last_action_ai1, last_action_ai2):
     return last_action_ai1 * 3 + last_action_ai2
 
-def get_full_state(hand, board, position, pot_size, stack_ai, stack_opponent,
-                   current_bet, round_stage, winrate,
-                   last_action_ai1, last_action_ai2,
-                   total_bet_opp, raises_this_street,
-                   fold_count, call_count, raise_count,
-                   total_hands, action_history):
+def get_card_features(hand, board):
+    """
+    The part of get_full_state that depends only on the cards, so it stays
+    the same until the board changes.
+    """
+    score = get_hand_strength(hand, board)
+    return (
+        hand[0][0] / 14,
+        hand[1][0] / 14,
+        int(hand[0][1] == hand[1][1]),
+        get_hand_category(hand[0], hand[1]),
+        score,
+        has_flush_draw(hand, board),
+        has_straight_draw(hand, board),
+        get_overcards_count(hand, board),
+        card_buckets.card_bucket(to_ints(hand), to_ints(board)),
+    )
 
-    card1_val, card2_val = hand[0][0], hand[1][0]
-    same_suit = int(hand[0][1] == hand[1][1])
-    hand_cat = get_hand_category(hand[0], hand[1])
-    street = {"preflop": 0, "flop": 1, "turn": 2, "river": 3}[round_stage]
-    spr = min(stack_ai, stack_opponent) / (pot_size + 1e-6)
+def get_card_features_batch(hands, boards, street):
+    """
+    get_card_features over an (N, 2) array of integer hole cards and an
+    (N, 5) array of integer boards, of which the first BOARD_SIZE[street]
+    cards are dealt. Returns an (N, 9) array.
+    """
+    board_size = BOARD_SIZE[street]
+    visible = np.arange(5) < board_size[:, None]
 
-    flush_draw = has_flush_draw(hand, board)
-    straight_draw = has_straight_draw(hand, board)
-    overcards = get_overcards_count(hand, board)
+    ranks = (hands >> 2) + 2
+    suits = hands & 3
+    board_ranks = np.where(visible, (boards >> 2) + 2, 0)
+    board_suits = np.where(visible, boards & 3, -1)
 
-    score = get_hand_strength(hand, board)
-    bucket = get_hand_strength_bucket(score)
+    r1, r2 = ranks[:, 0], ranks[:, 1]
+    same_suit = suits[:, 0] == suits[:, 1]
+    gap = np.abs(r1 - r2)
+    hand_cat = np.select(
+        [r1 == r2, same_suit & (gap == 1), same_suit, gap == 1,
+         np.maximum(r1, r2) >= 13, np.minimum(r1, r2) <= 6],
+        [0, 1, 2, 3, 4, 5], 6)
 
-    opponent_aggression = get_aggression_factor(raise_count, call_count)
-    pattern_idx = get_betting_pattern_index(last_action_ai1, last_action_ai2)
+    suit_counts = np.stack([(suits == s).sum(axis=1) + (board_suits == s).sum(axis=1)
+                            for s in range(4)], axis=1)
+    flush_draw = (suit_counts >= 4).any(axis=1)
 
-    total_hands = max(total_hands, 1)
+    rank_mask = (np.bitwise_or.reduce(np.left_shift(1, ranks - 2), axis=1)
+                 | np.bitwise_or.reduce(np.where(visible, np.left_shift(1, boards >> 2), 0), axis=1))
+    straight_draw = np.zeros(len(hands), dtype=bool)
+    for low in range(13):
+        straight_draw |= WINDOW_COUNT[(rank_mask >> low) & 0b11111] >= 4
 
-    # Action history embedding
-    action_sequence = [0.0] * 10  # neutral padding (valid in Box[0,1])
+    max_board = board_ranks.max(axis=1)
+    overcards = np.where(board_size > 0, (ranks > max_board[:, None]).sum(axis=1), 0)
 
-    flat = [a for (_, a) in action_history[-10:]]
-    for i in range(len(flat)):
-        action_sequence[i] = flat[i] / 4.0  # normalized action (0–1 range)
+    score = np.empty(len(hands))
+    preflop = street == 0
+    score[preflop] = 1.0 - round_array(1.0 - preflop_equity_batch(hands[preflop]), 3)
+    for s in (1, 2, 3):
+        rows = street == s
+        if rows.any():
+            cards = np.concatenate([hands[rows], boards[rows, :BOARD_SIZE[s]]], axis=1)
+            score[rows] = evaluate_batch(cards) / MAX_RANK
+    bucket = card_buckets.card_bucket_batch(hands, boards, board_size)
 
-    opponent_looseness = (call_count + raise_count) / total_hands
-    opponent_fold_rate = fold_count / total_hands
+    return np.column_stack([r1 / 14, r2 / 14, same_suit, hand_cat, score,
+                            flush_draw, straight_draw, overcards, bucket])
 
+def state_columns(card_features, position, pot_size, stack_ai, stack_opponent,
+                  current_bet, street, winrate,
+                  last_action_ai1, last_action_ai2,
+                  total_bet_opp, raises_this_street,
+                  fold_count, call_count, raise_count,
+                  total_hands, actions, batch=False):
+    """
+    The 37 observation columns in order, the one definition behind
+    get_full_state and get_full_state_batch. Given plain values (actions:
+    the last actions, oldest first) each column is a number; with batch,
+    every argument is an array of N values (card_features its 9 columns,
+    actions an (N, HISTORY_LEN) array padded with -1) and so is each column.
+    """
+    if batch:
+        total_hands = np.maximum(total_hands, 1)
+        smaller_stack = np.minimum(stack_ai, stack_opponent)
+        opponent_aggression = round_array(raise_count / (call_count + 1), 2)
+        action_sequence = list(np.maximum(actions, 0).T / 4.0)
+    else:
+        total_hands = max(total_hands, 1)
+        smaller_stack = min(stack_ai, stack_opponent)
+        opponent_aggression = get_aggression_factor(raise_count, call_count)
+        # Action history embedding, neutral padding (valid in Box[0,1])
+        action_sequence = [a / 4.0 for a in actions] + [0.0] * (HISTORY_LEN - len(actions))
+
+    (card1, card2, same_suit, hand_cat, score,
+     flush_draw, straight_draw, overcards, bucket) = card_features
     return [
-        card1_val / 14,
-        card2_val / 14,
+        card1,
+        card2,
         same_suit,
         hand_cat,
         position,
@@ -144,7 +210,7 @@ def get_full_state(hand, board, position, pot_size, stack_ai, stack_opponent,
         stack_opponent / 100,
         pot_size / 100,
         current_bet / 100,
-        spr,
+        smaller_stack / (pot_size + 1e-6),  # SPR
         winrate,
         score,
         flush_draw,
@@ -159,7 +225,90 @@ def get_full_state(hand, board, position, pot_size, stack_ai, stack_opponent,
         bucket,
         street,
         opponent_aggression,
-        opponent_looseness,
-        opponent_fold_rate,
-        pattern_idx
+        (call_count + raise_count) / total_hands,  # opponent looseness
+        fold_count / total_hands,                  # opponent fold rate
+        get_betting_pattern_index(last_action_ai1, last_action_ai2),
     ] + action_sequence
+
+def get_full_state_batch(hands, boards, position, pot_size, stack_ai, stack_opponent,
+                         current_bet, street, winrate,
+                         last_action_ai1, last_action_ai2,
+                         total_bet_opp, raises_this_street,
+                         fold_count, call_count, raise_count,
+                         total_hands, action_history,
+                         card_features=None, out=None):
+    """
+    get_full_state over N states as an (N, 37) float32 array. Every argument
+    is an array of N values, street as 0-3; hands and boards are as in
+    get_card_features_batch, whose (N, 9) result may be passed as
+    card_features instead. action_history is an (N, HISTORY_LEN) array of
+    the last actions, oldest first, -1 where there is none. With out, the
+    features are written there.
+    """
+    if card_features is None:
+        card_features = get_card_features_batch(hands, boards, street)
+    columns = state_columns(
+        card_features.T, position, pot_size, stack_ai, stack_opponent,
+        current_bet, street, winrate,
+        last_action_ai1, last_action_ai2,
+        total_bet_opp, raises_this_street,
+        fold_count, call_count, raise_count,
+        total_hands, action_history, batch=True)
+    if out is None:
+        out = np.empty((len(card_features), OBS_SIZE), dtype=np.float32)
+    out[:] = np.array(columns, dtype=np.float64).T
+    return out
+
+def get_full_state(hand, board, position, pot_size, stack_ai, stack_opponent,
+                   current_bet, round_stage, winrate,
+                   last_action_ai1, last_action_ai2,
+                   total_bet_opp, raises_this_street,
+                   fold_count, call_count, raise_count,
+                   total_hands, action_history,
+                   card_features=None, out=None):
+    """
+    37 observation features. card_features may be passed in from a cache of
+    get_card_features; with out (a float32 array of 37), the features are
+    written there and out is returned instead of a new list.
+    """
+    if card_features is None:
+        card_features = get_card_features(hand, board)
+    state = state_columns(
+        card_features, position, pot_size, stack_ai, stack_opponent,
+        current_bet, STREETS[round_stage], winrate,
+        last_action_ai1, last_action_ai2,
+        total_bet_opp, raises_this_street,
+        fold_count, call_count, raise_count,
+        total_hands, [a for (_, a) in action_history[-HISTORY_LEN:]])
+    if out is None:
+        return state
+    out[:] = state
+    return out
+
+def observations_for(obs, feature_version):
+    """
+    obs (N x 37, FEATURE_VERSION) as a policy trained on feature_version
+    observations expects them. Version 1's strength bucket is recomputed
+    from the score column, which holds the same value in float32.
+    """
+    if feature_version == FEATURE_VERSION:
+        return obs
+    if feature_version != 1:
+        raise ValueError(f"Unknown feature version {feature_version}")
+    # Undo the float32 rounding of the score before comparing it with the
+    # bucket bounds: preflop it is 1 - a multiple of 0.001, later rank / MAX_RANK
+    # (none is near a rounding tie, so np.round agrees with round() here)
+    obs = np.array(obs, dtype=np.float32)
+    if obs.ndim == 1:  # one observation (Environment's opponent): plain floats are cheaper
+        steps = 1000 if obs[STREET] == 0 else MAX_RANK
+        k = round(float(obs[SCORE]) * steps)
+        score = 1.0 - (steps - k) / steps if obs[STREET] == 0 else k / steps
+        obs[BUCKET] = get_hand_strength_bucket(score)
+        return obs
+    obs = obs.reshape(-1, OBS_SIZE)
+    preflop = obs[:, STREET] == 0
+    steps = np.where(preflop, 1000.0, float(MAX_RANK))
+    k = np.round(obs[:, SCORE] * steps)
+    score = np.where(preflop, 1.0 - (steps - k) / steps, k / steps)
+    obs[:, BUCKET] = 4 - np.searchsorted(STRENGTH_BOUNDS, score, side="right")
+    return obs
@@ -0,0 +1,77 @@
+import os
+import numpy as np
+from cards import to_ints
+
+# Exact flop equities of every suit-isomorphic (hole cards, flop) class,
+# built once by build_flop_table.py. Row 0 of the table holds the sorted
+# class keys and row 1 the packed values: equity against a random hand in
+# the high 16 bits and E[equity^2] over all turn and river cards (the
+# hand's potential) in the low 16 bits, both fixed point (* EQUITY_SCALE).
+
+TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "flop_equity.npy")
+EQUITY_SCALE = 65535
+
+_table = None
+
+def available():
+    return _table is not None or os.path.exists(TABLE_PATH)
+
+def load_table():
+    global _table
+    if _table is None:
+        _table = np.load(TABLE_PATH, mmap_mode="r")
+    return _table
+
+def class_key(hole, flop):
+    """
+    Key of integer hole cards and flop up to suit relabelling: suits are
+    renamed in order of their (hole ranks, flop ranks) masks, then both card
+    groups are sorted and packed 6 bits a card.
+    """
+    masks = [0, 0, 0, 0]
+    for c in hole:
+        masks[c & 3] |= 1 << (13 + (c >> 2))
+    for c in flop:
+        masks[c & 3] |= 1 << (c >> 2)
+    order = sorted(range(4), key=lambda s: -masks[s])
+    suit = [0, 0, 0, 0]
+    for new, old in enumerate(order):
+        suit[old] = new
+    h = sorted((c & ~3) | suit[c & 3] for c in hole)
+    f = sorted((c & ~3) | suit[c & 3] for c in flop)
+    return h[0] << 24 | h[1] << 18 | f[0] << 12 | f[1] << 6 | f[2]
+
+def class_keys(holes, flops):
+    """class_key over (N, 2) and (N, 3) arrays of integer cards."""
+    holes, flops = np.asarray(holes, dtype=np.int64), np.asarray(flops, dtype=np.int64)
+    n = len(holes)
+    masks = np.zeros((n, 4), dtype=np.int64)
+    rows = np.arange(n)
+    for j in range(2):
+        np.bitwise_or.at(masks, (rows, holes[:, j] & 3), 1 << (13 + (holes[:, j] >> 2)))
+    for j in range(3):
+        np.bitwise_or.at(masks, (rows, flops[:, j] & 3), 1 << (flops[:, j] >> 2))
+    order = np.argsort(-masks, axis=1, kind="stable")
+    suit = np.argsort(order, axis=1)
+    h = np.sort((holes & ~3) | np.take_along_axis(suit, holes & 3, axis=1), axis=1)
+    f = np.sort((flops & ~3) | np.take_along_axis(suit, flops & 3, axis=1), axis=1)
+    return h[:, 0] << 24 | h[:, 1] << 18 | f[:, 0] << 12 | f[:, 1] << 6 | f[:, 2]
+
+def class_index(keys):
+    """Position of class keys in the table."""
+    # Same dtype as the table, or searchsorted converts the whole key row
+    return np.searchsorted(load_table()[0], np.asarray(keys, dtype=np.uint32))
+
+def lookup(keys):
+    """(equity, E[equity^2]) arrays for an array of class keys."""
+    values = load_table()[1, class_index(keys)]
+    return (values >> 16) / EQUITY_SCALE, (values & 0xFFFF) / EQUITY_SCALE
+
+def flop_equity(hand, board):
+    """(equity, E[equity^2]) of hand on a 3-card board."""
+    equity, potential = lookup(class_key(to_ints(hand), to_ints(board)))
+    return float(equity), float(potential)
+
+def flop_equity_batch(holes, flops):
+    """flop_equity over (N, 2) and (N, 3) arrays of integer cards."""
+    return lookup(class_keys(holes, flops))
@@ -0,0 +1,98 @@
+import itertools
+import threading
+import numpy as np
+from treys.lookup import LookupTable
+
+# Table-driven 5/6/7-card evaluator over integer cards (see cards.to_int).
+# Scores follow treys: 1 is a royal flush, MAX_RANK is 7-5-4-3-2 offsuit.
+# The tables are built once per process, on first use, by whichever thread
+# gets there first; _unsuited is published last, so a thread that sees it
+# set finds every other table ready.
+
+MAX_RANK = LookupTable.MAX_HIGH_CARD  # 7462
+NO_FLUSH = MAX_RANK + 1
+PRIMES = [2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41]
+
+_unsuited = None  # prime product of the ranks -> best score, 5 to 7 cards
+_flush = None     # 13-bit rank mask of one suit -> best flush score
+
+# Array forms of the same tables for evaluate_batch
+_unsuited_keys = None
+_unsuited_scores = None
+_flush_scores = None
+_build_lock = threading.Lock()
+
+# Per-card keys: a hand is summarised by the product of its rank primes and
+# the OR of its card bits (16 bits per suit), so keys of disjoint card sets
+# combine with * and |.
+CARD_PRIMES = np.array([PRIMES[c >> 2] for c in range(52)], dtype=np.int64)
+CARD_BITS = np.array([1 << (16 * (c & 3) + (c >> 2)) for c in range(52)], dtype=np.int64)
+
+def _rank_product(rank_indices):
+    product = 1
+    for r in rank_indices:
+        product *= PRIMES[r]
+    return product
+
+def _build_tables():
+    global _unsuited, _flush, _unsuited_keys, _unsuited_scores, _flush_scores
+    with _build_lock:
+        if _unsuited is not None:  # built by another thread while this one waited
+            return
+        lookup = LookupTable()
+
+        # Best of the 6- and 7-rank multisets is the best after dropping one card.
+        unsuited = dict(lookup.unsuited_lookup)
+        for size in (6, 7):
+            for combo in itertools.combinations_with_replacement(range(13), size):
+                if any(combo.count(r) > 4 for r in set(combo)):
+                    continue
+                product = _rank_product(combo)
+                unsuited[product] = min(unsuited[product // PRIMES[r]] for r in set(combo))
+
+        flush = [NO_FLUSH] * (1 << 13)
+        for mask in sorted(range(1 << 13), key=lambda m: bin(m).count("1")):
+            bits = [r for r in range(13) if mask >> r & 1]
+            if len(bits) == 5:
+                flush[mask] = lookup.flush_lookup[_rank_product(bits)]
+            elif len(bits) > 5:
+                flush[mask] = min(flush[mask & ~(1 << r)] for r in bits)
+
+        _flush = flush
+        _unsuited_keys = np.array(sorted(unsuited), dtype=np.int64)
+        _unsuited_scores = np.array([unsuited[k] for k in _unsuited_keys], dtype=np.int32)
+        _flush_scores = np.array(flush, dtype=np.int32)
+        _unsuited = unsuited  # last: readers check it without the lock
+
+def evaluate(cards):
+    """Score of the best 5-card hand among 5 to 7 integer cards (lower is better)."""
+    if _unsuited is None:
+        _build_tables()
+    product = 1
+    masks = [0, 0, 0, 0]
+    for c in cards:
+        product *= PRIMES[c >> 2]
+        masks[c & 3] |= 1 << (c >> 2)
+    score = _unsuited[product]
+    for mask in masks:
+        if _flush[mask] < score:
+            score = _flush[mask]
+    return score
+
+def hand_keys(cards):
+    """(prime product, card bits) of each row of an (N, k) integer card array."""
+    cards = np.asarray(cards, dtype=np.int64)
+    return CARD_PRIMES[cards].prod(axis=1), np.bitwise_or.reduce(CARD_BITS[cards], axis=1)
+
+def evaluate_keys(products, bits):
+    """Scores of 5-7 card hands given by their hand_keys."""
+    if _unsuited is None:
+        _build_tables()
+    scores = _unsuited_scores[np.searchsorted(_unsuited_keys, products)]
+    for suit in range(4):
+        np.minimum(scores, _flush_scores[(bits >> (16 * suit)) & 0x1FFF], out=scores)
+    return scores
+
+def evaluate_batch(cards):
+    """Scores of an (N, 5-7) integer array of hands, one row per hand."""
+    return evaluate_keys(*hand_keys(cards))
@@ -0,0 +1,111 @@
+import os
+import queue
+import threading
+import numpy as np
+
+# Hand histories as fixed-width NumPy records appended to a binary file. The
+# file is a 16-byte header followed by the raw records, so read_history maps
+# it without copying or parsing. Cards are integers (cards.to_int), 255 for
+# a board card that was never dealt; unused action slots hold -1.
+
+MAGIC = b"PKHH"
+VERSION = 1
+HEADER_SIZE = 16
+MAX_ACTIONS = 8
+NO_CARD = 255
+CHUNK_SIZE = 4096  # records handed to the writer thread at once
+
+HAND_DTYPE = np.dtype([
+    ("ai1_hand", np.uint8, 2),
+    ("ai2_hand", np.uint8, 2),
+    ("board", np.uint8, 5),
+    ("num_actions", np.uint8),
+    ("actor", np.int8, MAX_ACTIONS),     # 0: AI1, 1: AI2
+    ("street", np.int8, MAX_ACTIONS),    # 0: preflop ... 3: river
+    ("action", np.int8, MAX_ACTIONS),    # 0: fold ... 4: all-in
+    ("bet", np.int16, MAX_ACTIONS),      # chips put in by the action
+    ("equity", np.float16, MAX_ACTIONS), # actor's winrate when acting
+    ("pot", np.int16),
+    ("chips", np.int16),                 # AI1's net chips
+    ("reward", np.float32),              # last reward returned by step
+])
+
+def new_records(count):
+    records = np.zeros(count, dtype=HAND_DTYPE)
+    records["board"] = NO_CARD
+    for field in ("actor", "street", "action", "bet", "equity"):
+        records[field] = -1
+    return records
+
+def header():
+    return MAGIC + np.array([VERSION, HAND_DTYPE.itemsize, 0], dtype=np.uint32).tobytes()
+
+class HandHistoryWriter:
+    """
+    Appends hand records to path. write() and write_batch() only copy into
+    an in-memory chunk; full chunks are written to disk by a background
+    thread. close() flushes what is left.
+    """
+
+    def __init__(self, path, chunk_size=CHUNK_SIZE):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.chunk = new_records(chunk_size)
+        self.filled = 0
+        self.count = 0
+        self.queue = queue.Queue(maxsize=16)
+
+        with open(path, "ab") as f:
+            if f.tell() == 0:
+                f.write(header())
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        with open(self.path, "ab") as f:
+            while True:
+                chunk = self.queue.get()
+                if chunk is None:
+                    break
+                chunk.tofile(f)
+                f.flush()
+
+    def write(self, record):
+        self.chunk[self.filled] = record
+        self.filled += 1
+        self.count += 1
+        if self.filled == self.chunk_size:
+            self._hand_off()
+
+    def write_batch(self, records):
+        start = 0
+        while start < len(records):
+            n = min(len(records) - start, self.chunk_size - self.filled)
+            self.chunk[self.filled:self.filled + n] = records[start:start + n]
+            self.filled += n
+            self.count += n
+            start += n
+            if self.filled == self.chunk_size:
+                self._hand_off()
+
+    def _hand_off(self):
+        self.queue.put(self.chunk[:self.filled])
+        self.chunk = new_records(self.chunk_size)
+        self.filled = 0
+
+    def close(self):
+        if self.filled:
+            self._hand_off()
+        self.queue.put(None)
+        self.thread.join()
+
+def read_history(path):
+    """Read-only memmap of every record in path."""
+    with open(path, "rb") as f:
+        head = f.read(HEADER_SIZE)
+    version, itemsize, _ = np.frombuffer(head[4:], dtype=np.uint32)
+    if head[:4] != MAGIC or version != VERSION or itemsize != HAND_DTYPE.itemsize:
+        raise ValueError(f"{path} is not a version {VERSION} hand history")
+    if os.path.getsize(path) == HEADER_SIZE:
+        return np.zeros(0, dtype=HAND_DTYPE)
+    return np.memmap(path, dtype=HAND_DTYPE, mode="r", offset=HEADER_SIZE)
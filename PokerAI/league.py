@@ -0,0 +1,137 @@
+import argparse
+import glob
+import math
+import os
+import sqlite3
+import time
+
+from model_evaluation import evaluate_duplicate
+from storage import file_hash
+
+# Round-robin league of every generation. Models are identified by the
+# SHA-256 of their zip, so a match result stays valid however the file is
+# named, and each pairing is played only once (duplicate deals, both seats).
+# Ratings are a Bradley-Terry fit of all stored results on the Elo scale.
+# Every deal scores the chips it won over both seatings, scaled from
+# -STACK..STACK to 0..1, so a model that wins big pots and folds small ones
+# is rated by what it earns rather than by how often it wins. (The former
+# matches table counted single seatings won, which keep the card luck; it
+# is no longer read and its pairings are played again.)
+
+DB_PATH = "league.db"
+BASE_RATING = 1500
+ELO_SCALE = 400 / math.log(10)
+FIT_ITERATIONS = 1000
+STACK = 100  # starting stack, the most a deal can win or lose
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS models (
+    hash TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    added REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS deal_results (
+    hash_a TEXT NOT NULL,
+    hash_b TEXT NOT NULL,
+    deals_won INTEGER NOT NULL,
+    deals_lost INTEGER NOT NULL,
+    deals_tied INTEGER NOT NULL,
+    chips_per_hand REAL NOT NULL,
+    played REAL NOT NULL,
+    PRIMARY KEY (hash_a, hash_b)
+);
+"""
+
+def model_hash(model_path):
+    """SHA-256 of model_path.zip."""
+    return file_hash(model_path + ".zip")
+
+def connect(path=DB_PATH):
+    db = sqlite3.connect(path)
+    db.executescript(SCHEMA)
+    return db
+
+def register(db, model_path):
+    """Adds model_path to the league (renaming it if the zip is known) and returns its hash."""
+    h = model_hash(model_path)
+    db.execute("INSERT INTO models (hash, name, added) VALUES (?, ?, ?) "
+               "ON CONFLICT(hash) DO UPDATE SET name = excluded.name",
+               (h, model_path, time.time()))
+    db.commit()
+    return h
+
+def missing_pairings(db):
+    """(name_a, name_b) of every pair of registered models without a result."""
+    rows = db.execute("""
+        SELECT a.name, b.name FROM models a JOIN models b ON a.hash < b.hash
+        WHERE NOT EXISTS (SELECT 1 FROM deal_results m WHERE m.hash_a = a.hash AND m.hash_b = b.hash)
+        ORDER BY a.added, b.added
+    """)
+    return rows.fetchall()
+
+def record(db, model_path_a, model_path_b, result):
+    """Stores result (evaluate_duplicate of a against b) under the ordered pair of hashes."""
+    hash_a, hash_b = model_hash(model_path_a), model_hash(model_path_b)
+    won, lost, chips = result["deals_won"], result["deals_lost"], result["chips_per_hand"]
+    if hash_a > hash_b:
+        hash_a, hash_b, won, lost, chips = hash_b, hash_a, lost, won, -chips
+    db.execute("INSERT OR REPLACE INTO deal_results VALUES (?, ?, ?, ?, ?, ?, ?)",
+               (hash_a, hash_b, won, lost, result["deals_tied"], chips, time.time()))
+    db.commit()
+
+def fit_ratings(db, iterations=FIT_ITERATIONS):
+    """
+    Bradley-Terry strengths of all models by minorization-maximization,
+    each deal scored by its chips (see the top of the file), returned as
+    {name: Elo} with mean BASE_RATING. The deals won, lost and tied are
+    stored for reporting only.
+    """
+    names = dict(db.execute("SELECT hash, name FROM models"))
+    wins = {h: 0.0 for h in names}
+    games = {}
+    rows = db.execute("SELECT hash_a, hash_b, deals_won + deals_lost + deals_tied, chips_per_hand "
+                      "FROM deal_results")
+    for hash_a, hash_b, deals, chips in rows:
+        if hash_a not in names or hash_b not in names:
+            continue
+        score = deals * (0.5 + chips / (2 * STACK))
+        wins[hash_a] += score
+        wins[hash_b] += deals - score
+        games[hash_a, hash_b] = games.get((hash_a, hash_b), 0) + deals
+
+    strength = {h: 1.0 for h in names}
+    for _ in range(iterations):
+        denom = {h: 0.0 for h in names}
+        for (a, b), n in games.items():
+            d = n / (strength[a] + strength[b])
+            denom[a] += d
+            denom[b] += d
+        strength = {h: max(wins[h], 1e-9) / denom[h] if denom[h] else 1.0 for h in names}
+        mean_log = sum(math.log(s) for s in strength.values()) / len(strength)
+        strength = {h: s / math.exp(mean_log) for h, s in strength.items()}
+
+    return {names[h]: BASE_RATING + ELO_SCALE * math.log(s) for h, s in strength.items()}
+
+def update(model_paths, db_path=DB_PATH, num_workers=None):
+    """Registers model_paths, plays only the pairings not yet in the league and returns the ratings."""
+    db = connect(db_path)
+    for path in model_paths:
+        register(db, path)
+    for name_a, name_b in missing_pairings(db):
+        if not (os.path.exists(name_a + ".zip") and os.path.exists(name_b + ".zip")):
+            continue
+        print(f"[LEAGUE] {name_a} vs {name_b}")
+        record(db, name_a, name_b, evaluate_duplicate(name_a, name_b, num_workers=num_workers))
+    ratings = fit_ratings(db)
+    db.close()
+    return ratings
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Update the league with every generation in this folder")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    paths = sorted((p[:-len(".zip")] for p in glob.glob("poker_ppo_gen*.zip")),
+                   key=lambda p: int(p[len("poker_ppo_gen"):]))
+    ratings = update(paths, num_workers=args.workers)
+    for name, rating in sorted(ratings.items(), key=lambda item: -item[1]):
+        print(f"{name}: {rating:.0f}")
@@ -1,13 +1,13 @@
-from stable_baselines3 import PPO
 from environment import Environment
 from config import ppo_gen
+from numpy_policy import load_policy
 
 # === CONFIG ===
 MODEL_PATH = f"poker_ppo_gen{ppo_gen - 1}"  # ← Change this to test different versions
 NUM_HANDS = 5
 
 # Load trained model
-model = PPO.load(MODEL_PATH)
+model = load_policy(MODEL_PATH)  # fed the observations it was trained on
 env = Environment()
 env.frozen_opponent = model  # Both agents use the same model (mirror match)
 
@@ -1,39 +1,222 @@
-from stable_baselines3 import PPO
-from environment import Environment
+import math
+import multiprocessing as mp
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 
-def evaluate_models(model_path_new, model_path_old, num_episodes=1000):
-    wins = 0
-    losses = 0
-    ties = 0
+from cards import deal_decks
+from numpy_policy import load_policy
+from vec_env import VecPokerEnv, POSITION, AI1_CARDS, AI2_CARDS, BOARD_CARDS
 
-    env = Environment()
-    env.frozen_opponent = PPO.load(model_path_old)
-    model_new = PPO.load(model_path_new)
+# Head-to-head evaluation. Hands are played in batches of VecPokerEnv tables
+# spread over a process pool, with both models deciding all their tables in
+# one forward pass. After every batch a sequential probability ratio test on
+# the new model's win rate decides whether to stop.
+#
+# Duplicate mode instead plays a fixed, stored set of deals twice with the
+# seats swapped and scores the paired chip difference, which cancels most
+# of the card luck.
 
-    for _ in range(num_episodes):
-        obs, _ = env.reset()
-        done = False
+P0 = 0.50          # H0: the new model wins at most this often
+P1 = 0.54          # H1: it wins at least this often
+ALPHA = 0.05       # chance of accepting H1 when H0 holds
+BETA = 0.05        # chance of accepting H0 when H1 holds
+MAX_HANDS = 50_000
+TABLES_PER_TASK = 64
+HANDS_PER_TABLE = 4
+Z_95 = 1.959964
+DEALS_PATH = "eval_deals.npy"
+NUM_DEALS = 5000
+DEALS_PER_TASK = 256
 
-        while not done:
-            if env.current_player == 0:
-                action, _ = model_new.predict(obs, deterministic=True)
-            else:
-                action, _ = env.frozen_opponent.predict(obs, deterministic=True)
+_models = None
 
-            obs, reward, done, _, _ = env.step(action)
+def _init_worker(model_path_new, model_path_old):
+    global _models
+    _models = (load_policy(model_path_new), load_policy(model_path_old))
 
-        if reward > 0:
-            wins += 1
-        elif reward < 0:
-            losses += 1
-        else:
-            ties += 1
+def _play_task(seed):
+    return play_hands(*_models, TABLES_PER_TASK, HANDS_PER_TABLE, seed)
 
-    winrate = wins / num_episodes
-    elo_change = calculate_elo_change(winrate)
+def _duplicate_task(deals):
+    model_new, model_old = _models
+    return play_deals(model_new, model_old, deals), play_deals(model_old, model_new, deals)
 
-    return winrate, elo_change
+def _pool(model_path_new, model_path_old, num_workers):
+    method = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+    return ProcessPoolExecutor(num_workers, mp_context=mp.get_context(method),
+                               initializer=_init_worker,
+                               initargs=(model_path_new, model_path_old))
+
+def act(model_ai1, model_ai2, obs):
+    """Deterministic actions of both models, each over the tables it is to act at."""
+    ai2 = obs[:, POSITION] == 1
+    actions = np.zeros(len(obs), dtype=np.int64)
+    if (~ai2).any():
+        actions[~ai2], _ = model_ai1.predict(obs[~ai2], deterministic=True)
+    if ai2.any():
+        actions[ai2], _ = model_ai2.predict(obs[ai2], deterministic=True)
+    return actions
+
+def play_hands(model_new, model_old, num_tables, hands_per_table, seed=None):
+    """
+    (wins, losses, ties) of model_new as AI1 against model_old as AI2, both
+    deterministic. Every table counts exactly hands_per_table hands, so
+    quick folds are not over-represented.
+    """
+    env = VecPokerEnv(num_tables, seed=seed, scheduled_opponent=True)
+    obs = env.reset()
+    played = np.zeros(num_tables, dtype=np.int64)
+    wins = losses = ties = 0
+
+    while (played < hands_per_table).any():
+        obs, rewards, dones, _ = env.step(act(model_new, model_old, obs))
+
+        counted = dones & (played < hands_per_table)
+        wins += int((rewards[counted] > 0).sum())
+        losses += int((rewards[counted] < 0).sum())
+        ties += int((rewards[counted] == 0).sum())
+        played += dones
+    return wins, losses, ties
+
+def sprt(wins, hands, p0=P0, p1=P1, alpha=ALPHA, beta=BETA):
+    """'H1' or 'H0' once the log-likelihood ratio crosses a bound, else None."""
+    llr = wins * math.log(p1 / p0) + (hands - wins) * math.log((1 - p1) / (1 - p0))
+    if llr >= math.log((1 - beta) / alpha):
+        return "H1"
+    if llr <= math.log(beta / (1 - alpha)):
+        return "H0"
+    return None
+
+def wilson_interval(wins, hands, z=Z_95):
+    """95% Wilson score interval of the win rate."""
+    if hands == 0:
+        return 0.0, 1.0
+    p = wins / hands
+    center = (p + z * z / (2 * hands)) / (1 + z * z / hands)
+    half = z * math.sqrt(p * (1 - p) / hands + z * z / (4 * hands * hands)) / (1 + z * z / hands)
+    return center - half, center + half
+
+def evaluate_models(model_path_new, model_path_old, max_hands=MAX_HANDS, num_workers=None,
+                    seed=None, p0=P0, p1=P1, alpha=ALPHA, beta=BETA):
+    """
+    Plays model_path_new against model_path_old until the SPRT is decisive
+    or max_hands have been played. Batches are consumed in submission order,
+    so the result only depends on seed. Returns a dict with winrate,
+    elo_change, the 95% interval (ci_low, ci_high), hands and decision
+    ("H1": new model is better, "H0": it is not, None: undecided).
+    """
+    num_workers = num_workers or os.cpu_count() or 1
+    hands_per_task = TABLES_PER_TASK * HANDS_PER_TABLE
+    seeds = np.random.SeedSequence(seed).spawn(math.ceil(max_hands / hands_per_task))
+
+    wins = losses = ties = 0
+    decision = None
+    with _pool(model_path_new, model_path_old, num_workers) as pool:
+        pending = deque()
+        next_task = 0
+        while True:
+            # Keep two batches queued per worker
+            while next_task < len(seeds) and len(pending) < 2 * num_workers:
+                pending.append(pool.submit(_play_task, seeds[next_task]))
+                next_task += 1
+            if not pending:
+                break
+
+            w, l, t = pending.popleft().result()
+            wins, losses, ties = wins + w, losses + l, ties + t
+            decision = sprt(wins, wins + losses + ties, p0, p1, alpha, beta)
+            if decision is not None:
+                for future in pending:
+                    future.cancel()
+                break
+
+    hands = wins + losses + ties
+    winrate = wins / hands
+    ci_low, ci_high = wilson_interval(wins, hands)
+    return {
+        "winrate": winrate,
+        "elo_change": calculate_elo_change(winrate),
+        "ci_low": ci_low,
+        "ci_high": ci_high,
+        "hands": hands,
+        "wins": wins,
+        "losses": losses,
+        "ties": ties,
+        "decision": decision,
+    }
+
+def generate_deals(num_deals, seed=0):
+    """
+    (num_deals, 9) integer cards: AI1's hand, AI2's hand and the board,
+    dealt the way Environment deals them.
+    """
+    decks = deal_decks(np.random.default_rng(seed), num_deals)
+    return decks[:, AI1_CARDS + AI2_CARDS + BOARD_CARDS].astype(np.uint8)
+
+def load_deals(path=DEALS_PATH, num_deals=NUM_DEALS, seed=0):
+    """The stored evaluation deals, generated and saved on first use."""
+    if not os.path.exists(path):
+        np.save(path, generate_deals(num_deals, seed))
+    return np.load(path)
+
+def play_deals(model_ai1, model_ai2, deals, num_tables=TABLES_PER_TASK):
+    """AI1's net chips on every deal, each played once."""
+    chips = np.zeros(len(deals))
+    done = np.zeros(len(deals), dtype=bool)
+    env = VecPokerEnv(min(num_tables, len(deals)), scheduled_opponent=True, deals=deals)
+    obs = env.reset()
+    while not done.all():
+        obs, _, dones, infos = env.step(act(model_ai1, model_ai2, obs))
+        for i in np.flatnonzero(dones):
+            deal = infos[i]["deal"]
+            if not done[deal]:  # tables wrap around to deals already played
+                chips[deal] = infos[i]["chips"]
+                done[deal] = True
+    return chips
+
+def evaluate_duplicate(model_path_new, model_path_old, deals=None, num_workers=None):
+    """
+    Plays every stored deal twice, model_path_new as AI1 and then as AI2,
+    and scores the new model's chips summed over both seatings. Returns a
+    dict with chips_per_hand and its 95% interval (ci_low, ci_high), hands,
+    the deals won, lost and tied on the chips of both seatings together
+    (deals_won, deals_lost, deals_tied), the single seatings won, lost and
+    tied (wins, losses, ties; for reporting, the card luck does not cancel
+    in them) and decision ("H1" or "H0" when the interval excludes zero,
+    else None). There is no winrate: the share of seatings won ignores how
+    many chips changed hands and counts level seatings as non-wins.
+    """
+    deals = load_deals() if deals is None else deals
+    num_workers = num_workers or os.cpu_count() or 1
+    chunks = [deals[i:i + DEALS_PER_TASK] for i in range(0, len(deals), DEALS_PER_TASK)]
+    with _pool(model_path_new, model_path_old, num_workers) as pool:
+        results = list(pool.map(_duplicate_task, chunks))
+    seat1 = np.concatenate([r[0] for r in results])   # new model as AI1
+    seat2 = -np.concatenate([r[1] for r in results])  # new model as AI2
+
+    paired = (seat1 + seat2) / 2
+    chips_per_hand = float(paired.mean())
+    half = Z_95 * float(paired.std(ddof=1)) / math.sqrt(len(paired))
+    wins = int((seat1 > 0).sum() + (seat2 > 0).sum())
+    losses = int((seat1 < 0).sum() + (seat2 < 0).sum())
+    hands = 2 * len(deals)
+    deals_won, deals_lost = int((paired > 0).sum()), int((paired < 0).sum())
+    decision = "H1" if chips_per_hand - half > 0 else "H0" if chips_per_hand + half < 0 else None
+    return {
+        "chips_per_hand": chips_per_hand,
+        "ci_low": chips_per_hand - half,
+        "ci_high": chips_per_hand + half,
+        "hands": hands,
+        "wins": wins,
+        "losses": losses,
+        "ties": hands - wins - losses,
+        "deals_won": deals_won,
+        "deals_lost": deals_lost,
+        "deals_tied": len(deals) - deals_won - deals_lost,
+        "decision": decision,
+    }
 
 
 def calculate_elo_change(winrate, k=32):
@@ -0,0 +1,130 @@
+import argparse
+import os
+import numpy as np
+
+from features import FEATURE_VERSION, observations_for
+
+# Torch-free forward pass for the actor of an SB3 MlpPolicy (the frozen
+# opponent only needs actions, so the value head is not exported).
+# Weights can be stored as float32, float16 or int8 with one scale per
+# output unit; they are expanded to float32 once, at load time. The feature
+# version the policy was trained on is stored with it (1 when missing: the
+# files from before it was recorded), and the forward pass converts the
+# current observations to it.
+
+ACTIVATIONS = {
+    "tanh": np.tanh,
+    "relu": lambda x: np.maximum(x, 0.0),
+}
+
+def policy_path(model_path):
+    """Where the exported policy of poker_ppo_gen{n}(.zip) lives."""
+    return model_path + "_policy.npz"
+
+def quantize(weight, dtype):
+    if dtype == "int8":
+        scale = np.abs(weight).max(axis=1, keepdims=True) / 127.0
+        scale[scale == 0] = 1.0
+        return np.round(weight / scale).astype(np.int8), scale.astype(np.float32)
+    return weight.astype(dtype), None
+
+def sample_actions(probs, u):
+    """Inverse-CDF draw of one action per row of probs from uniforms u."""
+    cdf = probs.cumsum(axis=1)
+    return np.minimum((cdf < np.reshape(u, (-1, 1))).sum(axis=1), cdf.shape[1] - 1)
+
+class NumpyPolicy:
+    def __init__(self, weights, biases, activation="tanh", seed=None, feature_version=FEATURE_VERSION):
+        self.feature_version = feature_version
+        self.weights = [np.ascontiguousarray(w, dtype=np.float32) for w in weights]
+        self.biases = [np.asarray(b, dtype=np.float32) for b in biases]
+        self.activation = activation
+        self.act = ACTIVATIONS[activation]
+        self.rng = np.random.default_rng(seed)
+
+    @classmethod
+    def from_ppo(cls, model, seed=None, feature_version=FEATURE_VERSION):
+        policy = model.policy
+        layers = [m for m in policy.mlp_extractor.policy_net if hasattr(m, "weight")]
+        layers.append(policy.action_net)
+        activation = policy.activation_fn.__name__.lower()
+        return cls([m.weight.detach().cpu().numpy() for m in layers],
+                   [m.bias.detach().cpu().numpy() for m in layers],
+                   activation, seed, feature_version)
+
+    def save(self, path, dtype="float32"):
+        arrays = {"activation": np.array(self.activation), "dtype": np.array(dtype),
+                  "feature_version": np.array(self.feature_version)}
+        for i, (w, b) in enumerate(zip(self.weights, self.biases)):
+            stored, scale = quantize(w, dtype)
+            arrays[f"w{i}"] = stored
+            arrays[f"b{i}"] = b
+            if scale is not None:
+                arrays[f"s{i}"] = scale
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path, seed=None):
+        data = np.load(path)
+        weights, biases = [], []
+        i = 0
+        while f"w{i}" in data:
+            w = data[f"w{i}"].astype(np.float32)
+            if f"s{i}" in data:
+                w *= data[f"s{i}"]
+            weights.append(w)
+            biases.append(data[f"b{i}"])
+            i += 1
+        feature_version = int(data["feature_version"]) if "feature_version" in data else 1
+        return cls(weights, biases, str(data["activation"]), seed, feature_version)
+
+    def logits(self, obs):
+        obs = observations_for(obs, self.feature_version)
+        x = np.asarray(obs, dtype=np.float32).reshape(-1, self.weights[0].shape[1])
+        for w, b in zip(self.weights[:-1], self.biases[:-1]):
+            x = self.act(x @ w.T + b)
+        return x @ self.weights[-1].T + self.biases[-1]
+
+    def action_probs(self, obs):
+        logits = self.logits(obs)
+        logits -= logits.max(axis=1, keepdims=True)
+        probs = np.exp(logits)
+        return probs / probs.sum(axis=1, keepdims=True)
+
+    def predict(self, obs, state=None, episode_start=None, deterministic=False, rng=None):
+        """
+        Same contract as PPO.predict: (actions, None), unbatched for one obs.
+        Samples from rng if given, else from the policy's own Generator.
+        """
+        rng = self.rng if rng is None else rng
+        if deterministic:
+            actions = self.logits(obs).argmax(axis=1)
+        else:
+            probs = self.action_probs(obs)
+            actions = sample_actions(probs, rng.random(len(probs)))
+        if np.ndim(obs) == 1:
+            return actions[0], None
+        return actions, None
+
+def load_policy(model_path, seed=None):
+    """
+    Exported policy of model_path if there is one, else convert the PPO zip
+    (taken to be trained on the current FEATURE_VERSION).
+    """
+    if os.path.exists(policy_path(model_path)):
+        return NumpyPolicy.load(policy_path(model_path), seed)
+    from stable_baselines3 import PPO
+    return NumpyPolicy.from_ppo(PPO.load(model_path), seed)
+
+if __name__ == "__main__":
+    from stable_baselines3 import PPO
+
+    parser = argparse.ArgumentParser(description="Export a PPO zip to a NumPy policy")
+    parser.add_argument("model_path", help="e.g. poker_ppo_gen1")
+    parser.add_argument("--dtype", default="float32", choices=["float32", "float16", "int8"])
+    parser.add_argument("--feature-version", type=int, default=FEATURE_VERSION,
+                        help="observation version the model was trained on (see features.py)")
+    args = parser.parse_args()
+    policy = NumpyPolicy.from_ppo(PPO.load(args.model_path), feature_version=args.feature_version)
+    policy.save(policy_path(args.model_path), args.dtype)
+    print(f"Saved NumPy policy: {policy_path(args.model_path)}")
@@ -0,0 +1,97 @@
+import glob
+import json
+import os
+import numpy as np
+
+from numpy_policy import NumpyPolicy, load_policy
+from storage import atomic_write
+
+# Past generations packed into one flat float32 file. Every process maps it
+# read-only, so the weights sit once in the page cache however many
+# environments and workers use them; the policies are views into the map.
+#
+# The pool is its .json index plus the weights file the index names. Every
+# build writes a new, versioned weights file and then renames one new index
+# into place, so a reader sees either the old pool or the new one, whole.
+
+POOL_PATH = "opponent_pool.json"
+
+def data_path(path, version):
+    return f"{os.path.splitext(path)[0]}.{version}.npy"
+
+def build_pool(model_paths, path=POOL_PATH):
+    """Flattens the policies of model_paths into a new weights file indexed by path and returns path."""
+    chunks, models = [], []
+    offset = 0
+    for model_path in model_paths:
+        policy = load_policy(model_path)
+        layers = []
+        for w, b in zip(policy.weights, policy.biases):
+            layers.append({"w": [offset, *w.shape], "b": [offset + w.size, b.size]})
+            chunks += [w.ravel(), b.ravel()]
+            offset += w.size + b.size
+        models.append({"name": model_path, "activation": policy.activation,
+                       "feature_version": policy.feature_version, "layers": layers})
+
+    version = 0
+    if os.path.exists(path):
+        with open(path) as f:
+            version = json.load(f).get("version", -1) + 1
+    data = data_path(path, version)
+    np.save(data, np.concatenate(chunks).astype(np.float32))  # unreferenced until the index names it
+
+    with atomic_write(path) as f:
+        json.dump({"version": version, "data": os.path.basename(data), "models": models}, f)
+
+    # The previous version is kept for readers that have just read the old
+    # index; anything older is no longer reachable
+    for stale in glob.glob(data_path(path, "*")):
+        name = os.path.basename(stale).rsplit(".", 2)
+        if name[-2].isdigit() and int(name[-2]) < version - 1:
+            os.remove(stale)
+    return path
+
+class OpponentPool:
+    """
+    NumpyPolicy views of every model in a pool file. Environment draws one
+    per hand through next_hand(); OpponentScheduler draws one per table and
+    hand and batches each opponent's tables together.
+    """
+
+    def __init__(self, names, policies, seed=None):
+        self.names = names
+        self.policies = policies
+        self.rng = np.random.default_rng(seed)
+        self.current = 0
+
+    @classmethod
+    def load(cls, path=POOL_PATH, seed=None):
+        with open(path) as f:
+            index = json.load(f)
+        flat = np.load(os.path.join(os.path.dirname(path), index["data"]), mmap_mode="r")
+        names, policies = [], []
+        for model in index["models"]:
+            weights, biases = [], []
+            for layer in model["layers"]:
+                start, rows, cols = layer["w"]
+                weights.append(flat[start:start + rows * cols].reshape(rows, cols))
+                start, size = layer["b"]
+                biases.append(flat[start:start + size])
+            names.append(model["name"])
+            policies.append(NumpyPolicy(weights, biases, model["activation"], seed,
+                                        model.get("feature_version", 1)))
+        return cls(names, policies, seed)
+
+    def __len__(self):
+        return len(self.policies)
+
+    def sample(self, rng=None, size=None):
+        """Index of a uniformly drawn opponent (or size of them)."""
+        rng = self.rng if rng is None else rng
+        return rng.integers(len(self.policies), size=size)
+
+    def next_hand(self, rng=None):
+        self.current = self.sample(rng)
+
+    def predict(self, obs, state=None, episode_start=None, deterministic=False, rng=None):
+        return self.policies[self.current].predict(obs, state, episode_start, deterministic, rng)
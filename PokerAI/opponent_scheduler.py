@@ -0,0 +1,83 @@
+import numpy as np
+from stable_baselines3.common.vec_env import VecEnvWrapper
+
+from numpy_policy import NumpyPolicy, sample_actions
+from opponent_pool import OpponentPool
+from vec_env import POSITION
+
+class OpponentScheduler(VecEnvWrapper):
+    """
+    Plays the frozen opponent for every table of a VecPokerEnv or
+    SubprocPokerEnv built with scheduled_opponent=True.
+
+    The observations returned by the last step already show which tables
+    wait on AI2 (position column set), so before the step is dispatched all
+    of them are decided in one batched forward pass and written into the
+    action array. Each table samples from its own Generator, split from
+    seed, so its actions match a per-table NumpyPolicy seeded the same way
+    no matter which other tables share the batch.
+
+    policy may also be an OpponentPool: every table then draws one of its
+    policies for each new hand, and the waiting tables are batched per
+    opponent.
+    """
+
+    def __init__(self, venv, policy, seed=None, deterministic=False):
+        super().__init__(venv)
+        self.deterministic = deterministic
+        self.rngs = [np.random.default_rng(s) for s in np.random.SeedSequence(seed).spawn(venv.num_envs)]
+        self.opponent = np.zeros(venv.num_envs, dtype=np.int64)  # index into policies per table
+        self.set_policy(policy)
+        self.last_obs = None
+
+    def set_policy(self, policy):
+        """Swaps the opponent (or pool) in place; tables keep their hands and rngs."""
+        if isinstance(policy, OpponentPool):
+            self.policies = policy.policies
+        elif policy is not None:
+            self.policies = [policy if isinstance(policy, NumpyPolicy) else NumpyPolicy.from_ppo(policy)]
+        else:
+            self.policies = None
+        self.policy = policy
+        self.draw_opponents(np.arange(self.num_envs))
+
+    def draw_opponents(self, tables):
+        if self.policies is None or len(self.policies) == 1:
+            self.opponent[tables] = 0
+            return
+        for i in tables:
+            self.opponent[i] = self.rngs[i].integers(len(self.policies))
+
+    def act(self, tables, obs):
+        """AI2's actions for tables, given their observations."""
+        if self.policies is None:
+            return np.array([self.rngs[i].integers(0, 5) for i in tables], dtype=np.int64)
+        if not self.deterministic:
+            u = np.array([self.rngs[i].random() for i in tables])
+        actions = np.empty(len(tables), dtype=np.int64)
+        which = self.opponent[tables]
+        for k in np.unique(which):
+            rows = which == k
+            policy = self.policies[k]
+            if self.deterministic:
+                actions[rows] = policy.logits(obs[rows]).argmax(axis=1)
+            else:
+                actions[rows] = sample_actions(policy.action_probs(obs[rows]), u[rows])
+        return actions
+
+    def reset(self):
+        self.last_obs = self.venv.reset()
+        return self.last_obs
+
+    def step_async(self, actions):
+        actions = np.array(actions, dtype=np.int64).reshape(self.num_envs)
+        tables = np.flatnonzero(self.last_obs[:, POSITION] == 1)
+        if len(tables):
+            actions[tables] = self.act(tables, self.last_obs[tables])
+        self.venv.step_async(actions)
+
+    def step_wait(self):
+        obs, rewards, dones, infos = self.venv.step_wait()
+        self.draw_opponents(np.flatnonzero(dones))
+        self.last_obs = obs
+        return obs, rewards, dones, infos
@@ -0,0 +1,322 @@
+import argparse
+import asyncio
+import os
+import re
+import signal
+import socket
+import numpy as np
+
+from cards import INT_CARDS
+from config import get_current_generation
+from environment import model_exists
+from features import (get_full_state_batch, get_winrate, evaluate_preflop_hand_strength,
+                      BOARD_SIZE, HISTORY_LEN, OBS_SIZE)
+from hand_history import NO_CARD
+from numpy_policy import load_policy, policy_path, sample_actions
+
+# Serves the newest generation to table clients. A request is one fixed-size
+# REQUEST_DTYPE record describing the game from the acting player's seat;
+# the server builds the 37 features with get_full_state_batch, waits up to
+# LATENCY_BUDGET for more requests and answers the whole micro-batch with
+# one forward pass. Features are built on a worker thread, so a batch of
+# uncached spots delays neither the event loop nor the batches after it. Clients may pipeline requests on a connection; each
+# RESPONSE_DTYPE record carries the id of its request.
+#
+#   python policy_server.py                  Unix socket at SOCKET_PATH
+#   python policy_server.py --port 8765      TCP on localhost
+#
+# The current generation is re-read every RELOAD_INTERVAL seconds (and on
+# SIGHUP); a new model is swapped in between batches without touching the
+# open connections.
+
+SOCKET_PATH = "poker_policy.sock"
+LATENCY_BUDGET = 0.002  # seconds the first request of a batch may wait
+MAX_BATCH = 1024
+RELOAD_INTERVAL = 5.0
+
+REQUEST_DTYPE = np.dtype([
+    ("id", "<u4"),
+    ("hand", np.uint8, 2),              # integer cards (cards.to_int)
+    ("board", np.uint8, 5),             # NO_CARD for cards not dealt
+    ("street", np.uint8),               # 0: preflop ... 3: river
+    ("position", np.uint8),             # 1 when the acting player is AI2
+    ("deterministic", np.uint8),
+    ("last_action_ai1", np.int8),
+    ("last_action_ai2", np.int8),
+    ("raises_this_street", np.uint8),
+    ("history", np.int8, HISTORY_LEN),  # last actions, oldest first, -1 unused
+    ("pot_size", "<f4"),
+    ("stack_ai", "<f4"),
+    ("stack_opponent", "<f4"),
+    ("current_bet", "<f4"),
+    ("total_bet_opp", "<f4"),
+    ("winrate", "<f4"),                 # NaN: computed by the server
+    ("fold_count", "<u4"),
+    ("call_count", "<u4"),
+    ("raise_count", "<u4"),
+    ("total_hands", "<u4"),
+])
+
+RESPONSE_DTYPE = np.dtype([
+    ("id", "<u4"),
+    ("action", np.uint8),               # 0: fold ... 4: all-in
+    ("generation", "<u2"),
+])
+
+def new_requests(count):
+    requests = np.zeros(count, dtype=REQUEST_DTYPE)
+    requests["board"] = NO_CARD
+    requests["history"] = -1
+    requests["winrate"] = np.nan
+    return requests
+
+def request_error(request):
+    """Why a request record cannot be answered, or None if it is valid."""
+    if request["street"] > 3:
+        return f"street {request['street']}"
+    hand, board = request["hand"], request["board"]
+    dealt = board[:BOARD_SIZE[request["street"]]]
+    if (dealt == NO_CARD).any() or (board[len(dealt):] != NO_CARD).any():
+        return f"{(board != NO_CARD).sum()} board cards on street {request['street']}"
+    if (hand >= 52).any() or (dealt >= 52).any():
+        return "card out of range"
+    if len(np.unique(np.concatenate([hand, dealt]))) != len(hand) + len(dealt):
+        return "duplicate card"
+    if request["position"] > 1 or request["deterministic"] > 1:
+        return "position or deterministic not 0/1"
+    if not (0 <= request["last_action_ai1"] <= 4 and 0 <= request["last_action_ai2"] <= 4):
+        return "last action out of range"
+    if ((request["history"] < -1) | (request["history"] > 4)).any():
+        return "history action out of range"
+    if not (np.isnan(request["winrate"]) or 0.0 <= request["winrate"] <= 1.0):
+        return "winrate out of range"
+    return None
+
+def observations(requests, out):
+    """Writes the features of an array of request records into out (float32, N x 37)."""
+    winrate = requests["winrate"].astype(np.float64)
+    for i in np.flatnonzero(np.isnan(winrate)):
+        hand = [INT_CARDS[c] for c in requests["hand"][i]]
+        board = [INT_CARDS[c] for c in requests["board"][i] if c != NO_CARD]
+        if board:
+            winrate[i] = get_winrate(hand, board)
+        else:
+            winrate[i] = evaluate_preflop_hand_strength(hand[0], hand[1])
+
+    def column(name, dtype=np.int64):
+        return requests[name].astype(dtype)
+
+    return get_full_state_batch(
+        column("hand"), column("board"), column("position"), column("pot_size", np.float64),
+        column("stack_ai", np.float64), column("stack_opponent", np.float64),
+        column("current_bet", np.float64), column("street"), winrate,
+        column("last_action_ai1"), column("last_action_ai2"), column("total_bet_opp", np.float64),
+        column("raises_this_street"), column("fold_count"), column("call_count"),
+        column("raise_count"), column("total_hands"), column("history"), out=out)
+
+def model_generation(path):
+    """n of a poker_ppo_gen{n} path, 0 for any other model (e.g. a checkpoint)."""
+    match = re.search(r"poker_ppo_gen(\d+)", os.path.basename(path))
+    generation = int(match.group(1)) if match else 0
+    if generation > np.iinfo(RESPONSE_DTYPE["generation"]).max:
+        print(f"[WARN] Generation {generation} does not fit a response, sending 0")
+        return 0
+    return generation
+
+def newest_model():
+    """Path of the newest trained generation, as Environment's frozen opponent."""
+    path = f"poker_ppo_gen{get_current_generation() - 1}"
+    return path if model_exists(path) else None
+
+def model_version(path):
+    """(path, mtime) of the file load_policy would read, to notice overwrites."""
+    source = policy_path(path) if os.path.exists(policy_path(path)) else path + ".zip"
+    return path, os.path.getmtime(source) if os.path.exists(source) else 0.0
+
+class PolicyServer:
+    def __init__(self, model_path=None, latency_budget=LATENCY_BUDGET, max_batch=MAX_BATCH,
+                 reload_interval=RELOAD_INTERVAL, seed=None):
+        self.model_path = model_path  # None follows the current generation
+        self.latency_budget = latency_budget
+        self.max_batch = max_batch
+        self.reload_interval = reload_interval
+        self.rng = np.random.default_rng(seed)
+        self.policy = None
+        self.version = None
+        self.generation = 0
+        self.pending = asyncio.Queue()
+        self.answering = set()  # batches whose features are still being built
+        self.batches = 0
+        self.requests = 0
+
+    async def reload(self):
+        path = self.model_path or newest_model()
+        if path is None:
+            return
+        version = model_version(path)
+        if version == self.version:
+            return
+        # Loaded off the event loop; the swap itself is one assignment
+        policy = await asyncio.to_thread(load_policy, path)
+        self.policy, self.version = policy, version
+        self.generation = model_generation(path)
+        print(f"[INFO] Serving {path}")
+
+    async def watch(self):
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            try:
+                await self.reload()
+            except Exception as e:  # a half-written model is retried next time
+                print(f"[WARN] Reload failed: {e}")
+
+    async def batcher(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.pending.get()]
+            deadline = loop.time() + self.latency_budget
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.pending.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # Not awaited: a batch of uncached spots must not hold up the next one
+            task = asyncio.create_task(self.answer_or_fail(batch))
+            self.answering.add(task)
+            task.add_done_callback(self.answering.discard)
+
+    async def answer_or_fail(self, batch):
+        try:
+            await self.answer(batch)
+        except Exception as e:  # fails this batch only, the server keeps serving
+            print(f"[WARN] Batch of {len(batch)} failed: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+    async def answer(self, batch):
+        n = len(batch)
+        requests = np.array([request for request, _ in batch], dtype=REQUEST_DTYPE)
+        # Equities and turn buckets of uncached spots are enumerated here
+        # (milliseconds each), so this runs off the event loop
+        obs = np.empty((n, OBS_SIZE), dtype=np.float32)
+        await asyncio.to_thread(observations, requests, obs)
+        deterministic = requests["deterministic"].astype(bool)
+        probs = self.policy.action_probs(obs)
+        actions = np.where(deterministic, probs.argmax(axis=1), sample_actions(probs, self.rng.random(n)))
+
+        responses = np.zeros(n, dtype=RESPONSE_DTYPE)
+        responses["id"] = requests["id"]
+        responses["action"] = actions
+        responses["generation"] = self.generation
+        for (_, future), response in zip(batch, responses):
+            if not future.done():
+                future.set_result(response.tobytes())
+        self.batches += 1
+        self.requests += n
+
+    async def handle(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        replies = asyncio.Queue()
+
+        async def send():
+            while True:
+                reply = await replies.get()
+                if reply is None:
+                    break
+                try:
+                    data = await reply
+                except Exception:
+                    writer.close()  # no answer to send; the client sees the connection close
+                    break
+                writer.write(data)
+                await writer.drain()
+
+        sender = asyncio.create_task(send())
+        try:
+            while True:
+                data = await reader.readexactly(REQUEST_DTYPE.itemsize)
+                request = np.frombuffer(data, dtype=REQUEST_DTYPE)[0]
+                error = request_error(request)
+                if error is not None:
+                    # The protocol has no error response: answer what came
+                    # before and close
+                    print(f"[WARN] Bad request {request['id']}: {error}")
+                    break
+                future = loop.create_future()
+                await self.pending.put((request, future))
+                await replies.put(future)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            await replies.put(None)
+            await sender
+            writer.close()
+
+    async def serve(self, socket_path=SOCKET_PATH, port=None):
+        await self.reload()
+        if self.policy is None:
+            raise FileNotFoundError("No trained generation to serve")
+        if port is None:
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+            server = await asyncio.start_unix_server(self.handle, socket_path)
+        else:
+            server = await asyncio.start_server(self.handle, "127.0.0.1", port)
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(signal.SIGHUP, lambda: asyncio.ensure_future(self.reload()))
+        tasks = [asyncio.create_task(self.batcher()), asyncio.create_task(self.watch())]
+        print(f"[INFO] Listening on {socket_path if port is None else f'127.0.0.1:{port}'}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for task in tasks + list(self.answering):
+                task.cancel()
+            if self.batches:
+                print(f"[INFO] {self.requests} requests in {self.batches} batches "
+                      f"({self.requests / self.batches:.1f} per batch)")
+
+class PolicyClient:
+    """Blocking client: act() sends one request record and returns its response."""
+
+    def __init__(self, socket_path=SOCKET_PATH, port=None):
+        if port is None:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.connect(socket_path)
+        else:
+            self.sock = socket.create_connection(("127.0.0.1", port))
+        self.next_id = 0
+
+    def act(self, request):
+        request = np.array(request, dtype=REQUEST_DTYPE)
+        request["id"] = self.next_id
+        self.next_id += 1
+        self.sock.sendall(request.tobytes())
+        data = b""
+        while len(data) < RESPONSE_DTYPE.itemsize:
+            chunk = self.sock.recv(RESPONSE_DTYPE.itemsize - len(data))
+            if not chunk:
+                raise ConnectionError("Server closed the connection")
+            data += chunk
+        return np.frombuffer(data, dtype=RESPONSE_DTYPE)[0]
+
+    def close(self):
+        self.sock.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the newest policy to table clients")
+    parser.add_argument("--socket", default=SOCKET_PATH)
+    parser.add_argument("--port", type=int, default=None, help="listen on 127.0.0.1:PORT instead of a Unix socket")
+    parser.add_argument("--model", default=None, help="serve this model instead of following the current generation")
+    parser.add_argument("--latency-ms", type=float, default=LATENCY_BUDGET * 1000)
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    args = parser.parse_args()
+    server = PolicyServer(args.model, args.latency_ms / 1000, args.max_batch)
+    try:
+        asyncio.run(server.serve(args.socket, args.port))
+    except KeyboardInterrupt:
+        pass
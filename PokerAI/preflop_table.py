@@ -0,0 +1,52 @@
+import os
+import numpy as np
+
+# Exact all-in equities for the 169 canonical starting hands, built once by
+# build_preflop_table.py. Row i holds hand class i; columns 0-168 are the
+# equity against each other class and column 169 the equity against a
+# random hand. Values are uint16 fixed point (equity * EQUITY_SCALE).
+TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "preflop_equity.npy")
+NUM_CLASSES = 169
+VS_RANDOM = NUM_CLASSES
+EQUITY_SCALE = 65535
+
+_table = None
+
+def load_table():
+    global _table
+    if _table is None:
+        _table = np.load(TABLE_PATH, mmap_mode="r")
+    return _table
+
+def hand_class(card1, card2):
+    """
+    Index (0-168) of a starting hand on the 13x13 grid (row * 13 + col):
+    pairs on the diagonal, suited hands below it (row > col), offsuit
+    hands above it.
+    """
+    r1, r2 = card1[0] - 2, card2[0] - 2
+    hi, lo = max(r1, r2), min(r1, r2)
+    if card1[1] == card2[1] and hi != lo:
+        return hi * 13 + lo
+    return lo * 13 + hi
+
+def preflop_equity(card1, card2):
+    """All-in equity of (card1, card2) against a random hand."""
+    return float(load_table()[hand_class(card1, card2), VS_RANDOM]) / EQUITY_SCALE
+
+def preflop_equity_vs(hand, opponent_hand):
+    """All-in equity of hand's class against opponent_hand's class."""
+    i = hand_class(hand[0], hand[1])
+    j = hand_class(opponent_hand[0], opponent_hand[1])
+    return float(load_table()[i, j]) / EQUITY_SCALE
+
+def preflop_classes(hands):
+    """hand_class over an (N, 2) array of integer hole cards (cards.to_int)."""
+    ranks, suits = hands >> 2, hands & 3
+    hi, lo = ranks.max(axis=1), ranks.min(axis=1)
+    suited = (suits[:, 0] == suits[:, 1]) & (hi != lo)
+    return np.where(suited, hi * 13 + lo, lo * 13 + hi)
+
+def preflop_equity_batch(hands):
+    """preflop_equity over an (N, 2) array of integer hole cards (cards.to_int)."""
+    return load_table()[preflop_classes(hands), VS_RANDOM] / EQUITY_SCALE
@@ -1,4 +1,6 @@
+import numpy as np
 from evaluate import evaluate_hands
+from features import round_array
 
 def calculate_reward(env, player, action, current_winrate):
     opponent = 1 - player
@@ -22,3 +24,11 @@ def calculate_reward(env, player, action, current_winrate):
             else: return 0
 
     return round((current_winrate - env.last_winrate) * env.pot, 3)
+
+def calculate_reward_batch(action, current_winrate, last_winrate, invested, pot):
+    """
+    calculate_reward over arrays of tables. Showdowns are settled by the
+    caller, as Environment.step does after the river action.
+    """
+    fold_reward = np.where(current_winrate < 0.3, 0.2, -round_array(current_winrate * invested, 2))
+    return np.where(action == 0, fold_reward, round_array((current_winrate - last_winrate) * pot, 3))
@@ -0,0 +1,32 @@
+import hashlib
+import os
+from contextlib import contextmanager
+
+# File helpers shared by everything that writes state other processes or a
+# later run read back: the generation counter, checkpoints, their manifest
+# and the opponent pool index.
+
+def file_hash(path):
+    """SHA-256 of the file at path."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+@contextmanager
+def atomic_write(path, mode="w"):
+    """
+    Opens a temporary file that replaces path once the block ends, so
+    readers and a crash never see path half-written.
+    """
+    tmp_path = path + ".tmp"
+    try:
+        with open(tmp_path, mode) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
@@ -0,0 +1,90 @@
+import time
+from contextlib import contextmanager
+import numpy as np
+
+class PhaseTimer:
+    """Wall time accumulated per named phase, e.g. with timer.phase("training"): ..."""
+
+    def __init__(self):
+        self.totals = {}
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.totals[name] = self.totals.get(name, 0.0) + time.perf_counter() - start
+
+    def total(self):
+        return sum(self.totals.values())
+
+    def summary(self):
+        return ", ".join(f"{name} {seconds:.1f}s" for name, seconds in self.totals.items())
+
+class HotPathProfiler:
+    """
+    Wall time and call count per phase of the simulator hot path. enable()
+    swaps timed wrappers in for the functions behind each phase and
+    disable() puts the originals back, so a disabled profiler costs nothing.
+
+    targets maps a phase name to the (module or class, attribute name)
+    pairs that make it up.
+    """
+
+    def __init__(self, targets):
+        self.targets = targets
+        self.samples = {phase: [] for phase in targets}
+        self.originals = []
+
+    def _timed(self, phase, fn):
+        samples = self.samples[phase]
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                samples.append(time.perf_counter() - start)
+        return timed
+
+    def enable(self):
+        if self.originals:
+            return
+        for phase, targets in self.targets.items():
+            for owner, name in targets:
+                original = owner.__dict__[name]
+                self.originals.append((owner, name, original))
+                setattr(owner, name, self._timed(phase, original))
+
+    def disable(self):
+        for owner, name, original in reversed(self.originals):
+            setattr(owner, name, original)
+        self.originals = []
+
+    def flush(self):
+        """{phase: durations in seconds} since the last flush."""
+        durations = {}
+        for phase, samples in self.samples.items():
+            durations[phase] = np.array(samples)
+            samples.clear()
+        return durations
+
+def step_profiler():
+    """HotPathProfiler over the phases of Environment.step and VecPokerEnv.step_wait."""
+    import environment
+    import vec_env
+    from numpy_policy import NumpyPolicy
+    from opponent_scheduler import OpponentScheduler
+
+    Environment, VecPokerEnv = environment.Environment, vec_env.VecPokerEnv
+    return HotPathProfiler({
+        "opponent": [(NumpyPolicy, "predict"), (OpponentScheduler, "act")],
+        "equity": [(environment, "get_winrate"), (environment, "evaluate_preflop_hand_strength"),
+                   (VecPokerEnv, "_winrates")],
+        "features": [(Environment, "_get_obs"), (VecPokerEnv, "_observations")],
+        "reward": [(environment, "calculate_reward"), (vec_env, "calculate_reward_batch")],
+        "showdown": [(environment, "evaluate_hands"), (VecPokerEnv, "_showdown")],
+        "dealing": [(environment, "deal_decks"), (environment, "deal_hole_cards"),
+                    (Environment, "advance_to_flop"), (Environment, "advance_to_turn"),
+                    (Environment, "advance_to_river"), (VecPokerEnv, "_deal")],
+    })
@@ -1,72 +1,172 @@
 from stable_baselines3 import PPO
-from environment import Environment
-from stable_baselines3.common.callbacks import ProgressBarCallback, CheckpointCallback
+from stable_baselines3.common.vec_env import VecMonitor
+from vec_env import VecPokerEnv, SubprocPokerEnv
+from opponent_scheduler import OpponentScheduler
+from environment import load_frozen_opponent
+from callbacks import WorkerTimingCallback, ProfilerCallback, AsyncCheckpointCallback
+from checkpoints import SNAPSHOT_DTYPE
+from numpy_policy import NumpyPolicy, policy_path
+from hand_history import HandHistoryWriter
+from opponent_pool import OpponentPool, build_pool
+from stable_baselines3.common.callbacks import ProgressBarCallback
 from config import ppo_gen, increment_generation
-from model_evaluation import evaluate_models
+from model_evaluation import evaluate_models, evaluate_duplicate
+import league
+from timing import PhaseTimer, step_profiler
 import pandas as pd
+import argparse
 import os
 
 # Config
-total_timesteps = 350_000 if ppo_gen == 0 else 2_000_000
-model_path = f"poker_ppo_gen{ppo_gen}"
-prev_model_path = f"poker_ppo_gen{ppo_gen - 1}"
-
-# Setup environment
-print(f"Training Generation {ppo_gen}")
-env = Environment()
-
-# Model architecture
-policy_kwargs = dict(net_arch=[256, 256])
-model = PPO(
-    "MlpPolicy",
-    env,
-    verbose=1,
-    tensorboard_log="./tensorboard_logs",
-    policy_kwargs=policy_kwargs
-)
-
-# Add checkpoint callback
-checkpoint_callback = CheckpointCallback(
-    save_freq=100_000,  # Save every 100k timesteps
-    save_path=f"./checkpoints/gen{ppo_gen}",
-    name_prefix="model"
-)
-
-# Train model
-model.learn(
-    total_timesteps=total_timesteps,
-    callback=[ProgressBarCallback(), checkpoint_callback]
-)
-
-# Save final model
-model.save(model_path)
-print(f"Saved final model: {model_path}")
-
-# Evaluation vs previous generation
-if ppo_gen > 0 and os.path.exists(prev_model_path + ".zip"):
-    winrate, elo_change = evaluate_models(model_path, prev_model_path)
-    print(f"Winrate vs Gen {ppo_gen - 1}: {winrate:.3f}, Elo Δ: {elo_change:+.2f}")
-
-    # Log to metrics.csv
-    row = {
-        "generation": ppo_gen,
-        "winrate_vs_prev": winrate,
-        "elo_change": elo_change
-    }
-    df = pd.DataFrame([row])
-    if os.path.exists("metrics.csv"):
-        df.to_csv("metrics.csv", mode="a", header=False, index=False)
+num_envs = 256  # tables stepped together, split evenly across workers
+
+def timesteps_for(gen):
+    return 350_000 if gen == 0 else 2_000_000
+
+def load_opponents(gen, pool_size=1):
+    """
+    The frozen opponent of generation gen: its predecessor, or with
+    pool_size > 1 a shared OpponentPool of the last pool_size generations.
+    """
+    if pool_size > 1:
+        generations = [f"poker_ppo_gen{g}" for g in range(max(gen - pool_size, 0), gen)]
+        generations = [g for g in generations if os.path.exists(g + ".zip")]
+        if generations:
+            print(f"[INFO] Opponent pool: {', '.join(generations)}")
+            return OpponentPool.load(build_pool(generations))
+    return load_frozen_opponent(f"poker_ppo_gen{gen - 1}")
+
+def make_env(num_workers, opponent, profile=False, hand_history=None):
+    """
+    Training tables; the frozen opponent's turns of all tables are batched
+    into one forward pass. hand_history is a file (one per worker) to record
+    every hand to.
+    """
+    if num_workers > 1:
+        venv = SubprocPokerEnv(num_workers, num_envs // num_workers, scheduled_opponent=True,
+                               hand_history=hand_history)
+        callbacks = [ProgressBarCallback(), WorkerTimingCallback()]
     else:
-        df.to_csv("metrics.csv", index=False)
-elif ppo_gen == 0:
-    # Create placeholder row for Gen 0
+        writer = None if hand_history is None else HandHistoryWriter(hand_history)
+        venv = VecPokerEnv(num_envs, scheduled_opponent=True, hand_history=writer)
+        callbacks = [ProgressBarCallback()]
+    if profile:
+        callbacks.append(ProfilerCallback(step_profiler()))
+    return VecMonitor(OpponentScheduler(venv, opponent)), callbacks
+
+def log_metrics(gen, result):
+    if result is None:
+        # Create placeholder row for Gen 0
+        row = {
+            "generation": 0,
+            "winrate_vs_prev": None,
+            "elo_change": None
+        }
+        pd.DataFrame([row]).to_csv("metrics.csv", index=False)
+        return
+
+    # Rewritten whole so older files gain the new columns
     row = {
-        "generation": 0,
-        "winrate_vs_prev": None,
-        "elo_change": None
+        "generation": gen,
+        # None in duplicate mode, where chips_per_hand and its interval are the result
+        "winrate_vs_prev": result.get("winrate"),
+        "elo_change": result.get("elo_change"),
+        "ci_low": result["ci_low"],
+        "ci_high": result["ci_high"],
+        "hands": result["hands"],
+        "decision": result["decision"],
+        "chips_per_hand": result.get("chips_per_hand")
     }
     df = pd.DataFrame([row])
+    if os.path.exists("metrics.csv"):
+        df = pd.concat([pd.read_csv("metrics.csv"), df], ignore_index=True)
     df.to_csv("metrics.csv", index=False)
 
-# Increment generation counter
-increment_generation()
+def train_generation(env, callbacks, gen, num_workers=1, duplicate=False, use_league=False, timer=None):
+    """Trains, saves and evaluates generation gen on env and returns the model."""
+    timer = PhaseTimer() if timer is None else timer
+    model_path = f"poker_ppo_gen{gen}"
+    prev_model_path = f"poker_ppo_gen{gen - 1}"
+    print(f"Training Generation {gen}")
+
+    with timer.phase("training"):
+        # Model architecture
+        policy_kwargs = dict(net_arch=[256, 256])
+        model = PPO(
+            "MlpPolicy",
+            env,
+            n_steps=2048 // num_envs,  # keep 2048 transitions per rollout
+            verbose=1,
+            tensorboard_log="./tensorboard_logs",
+            policy_kwargs=policy_kwargs
+        )
+
+        # Add checkpoint callback (written in the background)
+        checkpoint_callback = AsyncCheckpointCallback(
+            save_freq=100_000 // num_envs,  # Save every 100k timesteps
+            save_path=f"./checkpoints/gen{gen}",
+            name_prefix="model"
+        )
+
+        # Train model
+        model.learn(
+            total_timesteps=timesteps_for(gen),
+            callback=callbacks + [checkpoint_callback]
+        )
+
+    with timer.phase("saving"):
+        # Save final model
+        model.save(model_path)
+        print(f"Saved final model: {model_path}")
+        NumpyPolicy.from_ppo(model).save(policy_path(model_path), SNAPSHOT_DTYPE)  # torch-free opponent
+
+    with timer.phase("evaluation"):
+        # Evaluation vs previous generation
+        if gen > 0 and os.path.exists(prev_model_path + ".zip"):
+            if duplicate:
+                result = evaluate_duplicate(model_path, prev_model_path, num_workers=num_workers)
+                print(f"Duplicate vs Gen {gen - 1}: {result['chips_per_hand']:+.2f} chips/hand "
+                      f"[{result['ci_low']:+.2f}, {result['ci_high']:+.2f}] over {result['hands']} hands, "
+                      f"decision: {result['decision']}")
+            else:
+                result = evaluate_models(model_path, prev_model_path, num_workers=num_workers)
+                print(f"Winrate vs Gen {gen - 1}: {result['winrate']:.3f} "
+                      f"[{result['ci_low']:.3f}, {result['ci_high']:.3f}] over {result['hands']} hands, "
+                      f"Elo Δ: {result['elo_change']:+.2f}, SPRT: {result['decision']}")
+            log_metrics(gen, result)
+        elif gen == 0:
+            log_metrics(gen, None)
+
+        # Play the new generation against every earlier one not yet paired with it
+        if use_league:
+            generations = [f"poker_ppo_gen{g}" for g in range(gen + 1)]
+            ratings = league.update([g for g in generations if os.path.exists(g + ".zip")],
+                                    num_workers=num_workers)
+            print(f"League rating of Gen {gen}: {ratings[model_path]:.0f}")
+
+    return model
+
+def main(num_workers, duplicate=False, use_league=False, pool_size=1, profile=False, hand_history=None):
+    env, callbacks = make_env(num_workers, load_opponents(ppo_gen, pool_size), profile, hand_history)
+    train_generation(env, callbacks, ppo_gen, num_workers, duplicate, use_league)
+    env.close()
+
+    # Increment generation counter
+    increment_generation()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=1,
+                        help="rollout worker processes (num_envs tables are split across them)")
+    parser.add_argument("--duplicate", action="store_true",
+                        help="evaluate on the stored deals with swapped seats")
+    parser.add_argument("--league", action="store_true",
+                        help="update the league ratings (league.py) with the new generation")
+    parser.add_argument("--pool", type=int, default=1,
+                        help="train against this many past generations, drawn per hand")
+    parser.add_argument("--profile", action="store_true",
+                        help="log time per hot-path phase to TensorBoard")
+    parser.add_argument("--hand-history", default=None,
+                        help="record every training hand to this file (see hand_history.py)")
+    args = parser.parse_args()
+    main(args.workers, args.duplicate, args.league, args.pool, args.profile, args.hand_history)
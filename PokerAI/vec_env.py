@@ -0,0 +1,447 @@
+import multiprocessing as mp
+import time
+import numpy as np
+from gymnasium import spaces
+from stable_baselines3.common.vec_env import VecEnv
+
+from cards import from_int, deal_decks
+from environment import load_frozen_opponent
+from features import get_winrate, get_full_state_batch, round_array, BOARD_SIZE, HISTORY_LEN, OBS_SIZE
+from flop_table import available as flop_table_available, flop_equity_batch
+from hand_eval import evaluate_batch
+from numpy_policy import NumpyPolicy
+from hand_history import MAX_ACTIONS, NO_CARD, HandHistoryWriter, new_records
+from preflop_table import preflop_equity_batch
+from reward import calculate_reward_batch
+
+# Positions in a shuffled 52-card deck, matching Environment's pops from the
+# end of the deck: AI1's hand, AI2's hand, then burn + flop, burn + turn,
+# burn + river.
+AI1_CARDS = [51, 50]
+AI2_CARDS = [49, 48]
+BOARD_CARDS = [46, 45, 44, 42, 40]
+POSITION = 4  # observation column that is 1 when AI2 is to act
+
+class VecPokerEnv(VecEnv):
+    """
+    num_envs heads-up tables held as NumPy arrays and stepped together.
+    Observations, actions and rewards follow Environment; a finished table is
+    dealt a new hand at once and its last observation is returned in
+    info["terminal_observation"], with AI1's net chips in info["chips"]. With
+    scheduled_opponent=True the caller (see OpponentScheduler) supplies AI2's
+    actions in the action array. With deals, an (N, 9) array of fixed deals
+    (AI1's hand, AI2's hand, board), hands are dealt from it in order,
+    wrapping around, and info["deal"] tells which row a finished hand used.
+    With hand_history (a hand_history.HandHistoryWriter) every finished hand is
+    recorded; close() closes the writer.
+    """
+
+    def __init__(self, num_envs=256, seed=None, scheduled_opponent=False, deals=None, hand_history=None):
+        self.render_mode = None
+        self.rng = np.random.default_rng(seed)
+        self.scheduled_opponent = scheduled_opponent
+        self.frozen_opponent = None if scheduled_opponent else load_frozen_opponent()
+        self.deals = None if deals is None else np.asarray(deals, dtype=np.int64)
+        self.next_deal = 0
+
+        n = num_envs
+        self.hands = np.zeros((n, 2, 2), dtype=np.int64)   # [table, player, card]
+        self.deal_id = np.zeros(n, dtype=np.int64)         # row of deals in play
+        self.board = np.zeros((n, 5), dtype=np.int64)      # whole runout, shown by street
+        self.street = np.zeros(n, dtype=np.int64)          # 0: preflop ... 3: river
+        self.current_player = np.zeros(n, dtype=np.int64)
+        self.pot = np.zeros(n, dtype=np.int64)
+        self.stacks = np.zeros((n, 2), dtype=np.int64)
+        self.current_bet = np.zeros(n, dtype=np.int64)
+        self.total_bet = np.zeros((n, 2), dtype=np.int64)
+        self.last_action = np.zeros((n, 2), dtype=np.int64)
+        self.raises_this_street = np.zeros(n, dtype=np.int64)
+        self.fold_count = np.zeros(n, dtype=np.int64)
+        self.call_count = np.zeros(n, dtype=np.int64)
+        self.raise_count = np.zeros(n, dtype=np.int64)
+        self.last_winrate = np.zeros(n)
+        self.history = np.zeros((n, HISTORY_LEN), dtype=np.int64)  # ring of the last actions
+        self.history_count = np.zeros(n, dtype=np.int64)
+        self.obs = np.zeros((n, OBS_SIZE), dtype=np.float32)
+        self.actions = None
+
+        # Actions of the hand so far, for the hand history
+        self.hand_history = hand_history
+        self.log_count = np.zeros(n, dtype=np.int64)
+        self.log = {field: np.zeros((n, MAX_ACTIONS)) for field in ("actor", "street", "action", "bet", "equity")}
+
+        observation_space = spaces.Box(low=0.0, high=1.0, shape=(OBS_SIZE,), dtype=np.float32)
+        super().__init__(n, observation_space, spaces.Discrete(5))
+
+    def _deal(self, idx):
+        if self.deals is None:
+            decks = deal_decks(self.rng, len(idx))
+            self.hands[idx, 0] = decks[:, AI1_CARDS]
+            self.hands[idx, 1] = decks[:, AI2_CARDS]
+            self.board[idx] = decks[:, BOARD_CARDS]
+        else:
+            ids = (self.next_deal + np.arange(len(idx))) % len(self.deals)
+            self.next_deal += len(idx)
+            self.deal_id[idx] = ids
+            self.hands[idx, 0] = self.deals[ids, 0:2]
+            self.hands[idx, 1] = self.deals[ids, 2:4]
+            self.board[idx] = self.deals[ids, 4:9]
+
+        self.street[idx] = 0
+        self.current_player[idx] = 0
+        self.pot[idx] = 3
+        self.stacks[idx] = 100
+        self.current_bet[idx] = 2
+        self.total_bet[idx] = 0
+        self.last_action[idx] = 1
+        self.raises_this_street[idx] = 0
+        self.fold_count[idx] = 0
+        self.call_count[idx] = 0
+        self.raise_count[idx] = 0
+        self.last_winrate[idx] = 0.0
+        self.history_count[idx] = 0
+        self.log_count[idx] = 0
+
+    def _observations(self, idx):
+        """get_full_state for the player to act at each table in idx."""
+        player = self.current_player[idx]
+        fold_count = self.fold_count[idx]
+        call_count = self.call_count[idx]
+        raise_count = self.raise_count[idx]
+        stacks = self.stacks[idx]
+        last_action = self.last_action[idx]
+
+        # Oldest first, -1 past the actions taken
+        count = self.history_count[idx]
+        start = np.where(count > HISTORY_LEN, count % HISTORY_LEN, 0)
+        order = (start[:, None] + np.arange(HISTORY_LEN)) % HISTORY_LEN
+        history = np.take_along_axis(self.history[idx], order, axis=1)
+        history = np.where(np.arange(HISTORY_LEN) < np.minimum(count, HISTORY_LEN)[:, None], history, -1)
+
+        return get_full_state_batch(
+            self.hands[idx, player], self.board[idx], player == 1, self.pot[idx],
+            stacks[:, 0], stacks[:, 1], self.current_bet[idx], self.street[idx],
+            self.last_winrate[idx], last_action[:, 0], last_action[:, 1],
+            self.total_bet[idx, 1 - player], self.raises_this_street[idx],
+            fold_count, call_count, raise_count,
+            fold_count + call_count + raise_count, history)
+
+    def _winrates(self, tables):
+        """Equity of the acting player's hand, as Environment.step computes it."""
+        hands = self.hands[tables, self.current_player]
+        winrate = np.empty(len(tables))
+        preflop = self.street == 0
+        winrate[preflop] = round_array(1.0 - preflop_equity_batch(hands[preflop]), 3)
+        rest = ~preflop
+        if flop_table_available():
+            flop = self.street == 1
+            if flop.any():
+                equity, _ = flop_equity_batch(hands[flop], self.board[flop, :3])
+                winrate[flop] = round_array(equity, 3)
+            rest &= ~flop
+        for i in np.flatnonzero(rest):
+            board = self.board[i, :BOARD_SIZE[self.street[i]]]
+            winrate[i] = get_winrate([from_int(c) for c in hands[i]], [from_int(c) for c in board], rng=self.rng)
+        return winrate
+
+    def _showdown(self, rows):
+        """evaluate_hands(ai1_hand, ai2_hand, board) at each table in rows."""
+        ai1_scores = evaluate_batch(np.concatenate([self.hands[rows, 0], self.board[rows]], axis=1))
+        ai2_scores = evaluate_batch(np.concatenate([self.hands[rows, 1], self.board[rows]], axis=1))
+        return np.sign(ai2_scores - ai1_scores)
+
+    def _record_hands(self, idx, chips, rewards):
+        records = new_records(len(idx))
+        records["ai1_hand"] = self.hands[idx, 0]
+        records["ai2_hand"] = self.hands[idx, 1]
+        visible = np.arange(5) < BOARD_SIZE[self.street[idx]][:, None]
+        records["board"] = np.where(visible, self.board[idx], NO_CARD)
+        count = self.log_count[idx]
+        records["num_actions"] = count
+        used = np.arange(MAX_ACTIONS) < count[:, None]
+        for field, values in self.log.items():
+            records[field] = np.where(used, values[idx], records[field])
+        records["pot"] = self.pot[idx]
+        records["chips"] = chips[idx]
+        records["reward"] = rewards[idx]
+        self.hand_history.write_batch(records)
+
+    def reset(self):
+        if self._seeds[0] is not None:
+            self.rng = np.random.default_rng(self._seeds[0])
+        self._reset_seeds()
+        self._reset_options()
+
+        tables = np.arange(self.num_envs)
+        self.next_deal = 0
+        self._deal(tables)
+        self.obs = self._observations(tables)
+        self.reset_infos = [{} for _ in range(self.num_envs)]
+        return self.obs.copy()
+
+    def step_async(self, actions):
+        self.actions = actions
+
+    def step_wait(self):
+        tables = np.arange(self.num_envs)
+        actions = np.array(self.actions, dtype=np.int64).reshape(self.num_envs)
+        player = self.current_player.copy()
+
+        # Opponent (AI2) plays its own turns; the learner's action there is ignored
+        opp = np.flatnonzero(player == 1)
+        if len(opp):
+            if self.scheduled_opponent:
+                pass  # the caller already put AI2's actions in actions[opp]
+            elif isinstance(self.frozen_opponent, NumpyPolicy):
+                actions[opp], _ = self.frozen_opponent.predict(self.obs[opp], deterministic=False, rng=self.rng)
+            elif self.frozen_opponent:
+                actions[opp], _ = self.frozen_opponent.predict(self.obs[opp], deterministic=False)
+            else:
+                actions[opp] = self.rng.integers(0, 5, size=len(opp))
+            self.fold_count[opp] += actions[opp] == 0
+            self.call_count[opp] += actions[opp] == 1
+            self.raise_count[opp] += actions[opp] >= 2
+
+        # Bet sizes follow Environment.get_raise_amount
+        stack_ai1 = self.stacks[:, 0]
+        amount = np.select(
+            [actions == 1, actions == 2, actions == 3, actions == 4],
+            [self.current_bet, np.minimum(4, stack_ai1), np.minimum(self.pot, stack_ai1), stack_ai1], 0)
+        self.last_action[tables, player] = actions
+        self.total_bet[tables, player] += amount
+        self.stacks[tables, player] -= amount
+        self.pot += amount
+        self.raises_this_street += actions >= 2
+
+        self.last_winrate = self._winrates(tables)
+        if self.hand_history is not None:
+            rows = np.flatnonzero(self.log_count < MAX_ACTIONS)
+            slot = self.log_count[rows]
+            for field, values in (("actor", player), ("street", self.street), ("action", actions),
+                                  ("bet", amount), ("equity", self.last_winrate)):
+                self.log[field][rows, slot] = values[rows]
+            self.log_count[rows] += 1
+        rewards = calculate_reward_batch(actions, self.last_winrate, self.last_winrate,
+                                         self.total_bet[tables, player], self.pot)
+        folded = actions == 0
+        rewards[folded] = round_array(rewards[folded], 3)
+
+        acted = np.flatnonzero(~folded)
+        self.history[acted, self.history_count[acted] % HISTORY_LEN] = actions[acted]
+        self.history_count[acted] += 1
+
+        # +1 where AI1 takes the pot, -1 where AI2 does
+        winner = np.where(folded, 2 * player - 1, 0)
+
+        showdown = ~folded & (self.street == 3)
+        rows = np.flatnonzero(showdown)
+        if len(rows):
+            score1 = self._showdown(rows)
+            score2 = -score1
+            rewards[rows] = np.select([score1 < score2, score1 > score2], [1, -1], 0)
+            winner[rows] = score1
+
+        # The winner takes what the loser put in; blinds are not charged to
+        # either stack, so they are left out
+        chips = winner * np.where(winner > 0, self.total_bet[:, 1], self.total_bet[:, 0])
+
+        advance = ~folded & ~showdown
+        self.street[advance] += 1
+        self.raises_this_street[advance] = 0
+        self.current_player[advance] = 1 - self.current_player[advance]
+
+        dones = folded | showdown
+        obs = self._observations(tables)
+        infos = [{} for _ in range(self.num_envs)]
+        finished = np.flatnonzero(dones)
+        for i in finished:
+            infos[i]["terminal_observation"] = obs[i].copy()
+            infos[i]["chips"] = int(chips[i])
+            if self.deals is not None:
+                infos[i]["deal"] = int(self.deal_id[i])
+        if len(finished):
+            if self.hand_history is not None:
+                self._record_hands(finished, chips, rewards)
+            self._deal(finished)
+            obs[finished] = self._observations(finished)
+
+        self.obs = obs
+        return obs.copy(), rewards.astype(np.float32), dones, infos
+
+    def close(self):
+        if self.hand_history is not None:
+            self.hand_history.close()
+
+    def get_attr(self, attr_name, indices=None):
+        return [getattr(self, attr_name) for _ in self._get_indices(indices)]
+
+    # There is no env per table to reach: attributes and methods belong to
+    # the VecPokerEnv, which holds every table. set_attr and env_method act
+    # on it once, so they refuse indices that name only some of the tables;
+    # env_method's result is repeated for each index.
+
+    def _check_all_tables(self, name, indices):
+        indices = list(self._get_indices(indices))
+        if set(indices) != set(range(self.num_envs)):
+            raise NotImplementedError(f"{name} acts on all {self.num_envs} tables at once, "
+                                      f"not on tables {indices}")
+        return indices
+
+    def set_attr(self, attr_name, value, indices=None):
+        self._check_all_tables(attr_name, indices)
+        setattr(self, attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        indices = self._check_all_tables(method_name, indices)
+        result = getattr(self, method_name)(*method_args, **method_kwargs)
+        return [result for _ in indices]
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._get_indices(indices)]
+
+
+def _worker(remote, parent_remote, num_envs, seed, scheduled_opponent, hand_history_path):
+    import torch
+    torch.set_num_threads(1)  # one core per worker
+    parent_remote.close()
+
+    writer = None if hand_history_path is None else HandHistoryWriter(hand_history_path)
+    env = VecPokerEnv(num_envs, seed=seed, scheduled_opponent=scheduled_opponent, hand_history=writer)
+    steps = 0
+    busy = 0.0
+    while True:
+        cmd, data = remote.recv()
+        if cmd == "step":
+            start = time.perf_counter()
+            env.step_async(data)
+            result = env.step_wait()
+            busy += time.perf_counter() - start
+            steps += num_envs
+            remote.send(result)
+        elif cmd == "reset":
+            if data is not None:
+                env.seed(data)
+            remote.send(env.reset())
+        elif cmd == "stats":
+            remote.send({"steps": steps, "busy": busy})
+        elif cmd == "get_attr":
+            remote.send(getattr(env, data))
+        elif cmd == "set_attr":
+            setattr(env, *data)
+            remote.send(None)
+        elif cmd == "env_method":
+            name, args, kwargs = data
+            remote.send(getattr(env, name)(*args, **kwargs))
+        elif cmd == "close":
+            env.close()
+            remote.close()
+            break
+
+class SubprocPokerEnv(VecEnv):
+    """
+    VecPokerEnv split across worker processes. Each worker holds
+    envs_per_worker tables, loads the frozen opponent once (unless
+    scheduled_opponent) and draws from its own seed; worker_stats() reports
+    the steps and busy time of each. With hand_history, worker i records its
+    hands to hand_history + ".{i}".
+    """
+
+    def __init__(self, num_workers, envs_per_worker, seed=None, scheduled_opponent=False,
+                 hand_history=None):
+        self.render_mode = None
+        self.num_workers = num_workers
+        self.envs_per_worker = envs_per_worker
+        self.waiting = False
+
+        seeds = np.random.SeedSequence(seed).spawn(num_workers)
+        method = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+        ctx = mp.get_context(method)
+        self.remotes, self.work_remotes = zip(*[ctx.Pipe() for _ in range(num_workers)])
+        self.processes = []
+        for i, (work_remote, remote, worker_seed) in enumerate(zip(self.work_remotes, self.remotes, seeds)):
+            path = None if hand_history is None else f"{hand_history}.{i}"
+            args = (work_remote, remote, envs_per_worker, worker_seed, scheduled_opponent, path)
+            process = ctx.Process(target=_worker, args=args, daemon=True)
+            process.start()
+            self.processes.append(process)
+            work_remote.close()
+
+        observation_space = spaces.Box(low=0.0, high=1.0, shape=(OBS_SIZE,), dtype=np.float32)
+        super().__init__(num_workers * envs_per_worker, observation_space, spaces.Discrete(5))
+
+    def reset(self):
+        for i, remote in enumerate(self.remotes):
+            seed = self._seeds[i * self.envs_per_worker]
+            remote.send(("reset", seed))
+        obs = np.concatenate([remote.recv() for remote in self.remotes])
+        self._reset_seeds()
+        self._reset_options()
+        return obs
+
+    def step_async(self, actions):
+        for remote, chunk in zip(self.remotes, np.split(np.asarray(actions), self.num_workers)):
+            remote.send(("step", chunk))
+        self.waiting = True
+
+    def step_wait(self):
+        results = [remote.recv() for remote in self.remotes]
+        self.waiting = False
+        obs, rewards, dones, infos = zip(*results)
+        return (np.concatenate(obs), np.concatenate(rewards), np.concatenate(dones),
+                [info for worker_infos in infos for info in worker_infos])
+
+    def worker_stats(self):
+        for remote in self.remotes:
+            remote.send(("stats", None))
+        return [remote.recv() for remote in self.remotes]
+
+    def close(self):
+        if self.waiting:
+            for remote in self.remotes:
+                remote.recv()
+        for remote in self.remotes:
+            remote.send(("close", None))
+        for process in self.processes:
+            process.join()
+
+    def _worker_indices(self, indices):
+        return sorted({i // self.envs_per_worker for i in self._get_indices(indices)})
+
+    def get_attr(self, attr_name, indices=None):
+        if attr_name == "render_mode":
+            return [self.render_mode for _ in self._get_indices(indices)]
+        values = {}
+        for w in self._worker_indices(indices):
+            self.remotes[w].send(("get_attr", attr_name))
+            values[w] = self.remotes[w].recv()
+        return [values[i // self.envs_per_worker] for i in self._get_indices(indices)]
+
+    def _whole_shards(self, name, indices):
+        """
+        Workers of indices, which must name every table of each of them: a
+        worker's attributes and methods belong to its VecPokerEnv as a whole.
+        """
+        indices = list(self._get_indices(indices))
+        workers = sorted({i // self.envs_per_worker for i in indices})
+        covered = {w * self.envs_per_worker + t for w in workers for t in range(self.envs_per_worker)}
+        if set(indices) != covered:
+            raise NotImplementedError(f"{name} acts on a worker's {self.envs_per_worker} tables at once, "
+                                      f"not on tables {indices}")
+        return indices, workers
+
+    def set_attr(self, attr_name, value, indices=None):
+        _, workers = self._whole_shards(attr_name, indices)
+        for w in workers:
+            self.remotes[w].send(("set_attr", (attr_name, value)))
+            self.remotes[w].recv()
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        """Calls method_name once per worker and repeats its result for each of the worker's indices."""
+        indices, workers = self._whole_shards(method_name, indices)
+        for w in workers:
+            self.remotes[w].send(("env_method", (method_name, method_args, method_kwargs)))
+        results = {w: self.remotes[w].recv() for w in workers}
+        return [results[i // self.envs_per_worker] for i in indices]
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._get_indices(indices)]